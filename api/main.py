@@ -2,8 +2,9 @@ from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from app.retrieval.hybrid_retriever import HybridRetriever
-from app.generator.gpt_client import GPTClient
+from app.generator.gpt_client import get_gpt_client
 from app.cache.semantic_cache import SemanticCache
+from app.cache.global_cache import GlobalAnswerCache
 from fastapi.responses import StreamingResponse
 import time
 from app.memory.chat_memory import (
@@ -19,7 +20,12 @@ from app.db.models import ChatSession, ChatMessage, User
 from sqlalchemy.future import select
 from uuid import UUID
 from app.logger import logging
-from app.retrieval.embedding_client import EuriEmbeddingClient
+from app.retrieval.query_embedder import QueryEmbedder
+from app.retrieval.context_compressor import ContextCompressor
+from app.generator.answer_stream import AnswerStream
+from app.cache.utils import normalize_query, history_fingerprint
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
 from app.auth.auth_utils import get_current_active_user  # NEW
 from app.routers import auth  # NEW
 import asyncio
@@ -28,7 +34,6 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-semantic_cache = SemanticCache()
 
 app = FastAPI(title="Clinical RAG API")
 @app.on_event("startup")
@@ -56,12 +61,27 @@ async def startup_event():
     session.mount("http://", adapter)
     
     logging.info("✅ Connection pooling configured")
+
+    # Keep this worker's L1 semantic cache coherent with writes from other workers
+    semantic_cache.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Close the shared async HTTP pools
+    await llm.aclose()
+    await query_embedder.aclose()
 # Include auth routes
 app.include_router(auth.router)  # NEW
 
 retriever = HybridRetriever()
-llm = GPTClient()
-emb_client = EuriEmbeddingClient()
+# Caches follow the retriever's corpus version forward and ignore late writes for older ones
+semantic_cache = SemanticCache(current_version=lambda: retriever.corpus_version)
+global_cache = GlobalAnswerCache(current_version=lambda: retriever.corpus_version)
+llm = get_gpt_client()
+query_embedder = QueryEmbedder()
+# HybridRetriever logs and continues when init fails, so the batcher may be missing
+compressor = ContextCompressor(getattr(retriever, "rerank_batcher", None))
+answer_flights = SingleFlight(name="answer-singleflight")
 
 app.add_middleware(
     CORSMiddleware,
@@ -108,11 +128,19 @@ def stream_cached_answer(answer: str):
     for word in answer.split():
         yield word + " "
 
-def chunk_text(text: str, chunk_size=20):
-    words = text.split()
-    for i in range(0, len(words), chunk_size):
-        yield " ".join(words[i:i+chunk_size]) + " "
-        time.sleep(0.05)
+async def background_finalize_answer(session_id: UUID, question: str, answer_stream: AnswerStream,
+                                     query_embedding: list, corpus_version: str):
+    """Persists and caches the streamed answer, only once the stream has run to the end"""
+    async def persist(answer: str):
+        if not answer or answer.startswith("Sorry") or 'No contexts' in answer:
+            logging.warning("⚠️  LLM returned no usable answer, not saving or caching it")
+            return
+        await background_save_messages(session_id, [('user', question), ('assistant', answer)])
+        if 'Error' not in answer:
+            await semantic_cache.set(str(session_id), question, answer, query_embedding, corpus_version)
+            await global_cache.set(question, answer, query_embedding, corpus_version)
+
+    await answer_stream.finalize(persist)
 
 @app.post("/ask")
 async def ask_question(
@@ -125,10 +153,12 @@ async def ask_question(
     
     # Step 1: Generate embedding
     async with log_request_time("1. Embedding generation", t0):
-        query_embedding = emb_client.embed([req.question])
-        if not query_embedding:
+        try:
+            # Coalesced with concurrent requests into one embedding API call
+            query_embedding = await query_embedder.embed(req.question)
+        except Exception as e:
+            logging.error(f"Query embedding failed: {e}")
             raise HTTPException(status_code=503, detail="Embedding failed")
-        query_embedding = query_embedding[0]
     
     # Step 2: Session check/creation
     async with log_request_time("2. Session check/creation", t0):
@@ -156,14 +186,19 @@ async def ask_question(
         
         if is_new:
             try:
-                title = llm.generate_title(req.question)
+                title = await llm.generate_title(req.question)
             except:
                 title = req.question[:50]
             await set_session_title(db, session_id, title)
     
     # Step 3: Check cache
     async with log_request_time("3. Cache check", t0):
-        cached_answer = semantic_cache.get(req.session_id, req.question, query_embedding)
+        # Every cache tier is namespaced by the ingested corpus version
+        corpus_version = retriever.corpus_version
+        cached_answer = await semantic_cache.get(str(session_id), req.question, query_embedding, corpus_version)
+        if not cached_answer:
+            # Same standalone question answered in another session on this corpus
+            cached_answer = await global_cache.get(req.question, query_embedding, corpus_version)
         if cached_answer:
             logging.info("✅ Cache HIT - returning cached answer")
             return StreamingResponse(
@@ -181,13 +216,8 @@ async def ask_question(
         )
         summary_text = summary_obj.summary if summary_obj else None
     
-    # Step 5: Hybrid retrieval
-    async with log_request_time("5. Hybrid retrieval (BM25 + Vector + Rerank)", t0):
-        contexts = await retriever.hybrid_search(req.question, query_embedding)
-        logging.info(f"📄 Retrieved {len(contexts)} context chunks")
-    
-    # Step 6: Build history
-    async with log_request_time("6. Build conversation history", t0):
+    # Step 5: Build history
+    async with log_request_time("5. Build conversation history", t0):
         history = []
         if summary_text:
             history.append({"role": "system", "content": summary_text})
@@ -197,21 +227,46 @@ async def ask_question(
              "content": m['content'] if isinstance(m, dict) else m.content}
             for m in last_messages
         ])
-    
-    # Step 7: LLM generation
-    async with log_request_time("7. LLM generation", t0):
-        answer = llm.generate_text(req.question, contexts, history=history)
-        
-        if answer.startswith("Sorry"):
-            logging.warning("⚠️  LLM returned error message")
-            return StreamingResponse(iter([answer]), media_type="text/plain")
-    
-    # Step 8: Save to database (background)
+
+    async def produce_answer():
+        # Step 6: Hybrid retrieval
+        async with log_request_time("6. Hybrid retrieval (BM25 + Vector + Rerank)", t0):
+            contexts = await retriever.hybrid_search(req.question, query_embedding)
+            logging.info(f"📄 Retrieved {len(contexts)} context chunks")
+
+        # Step 6b: Extractive compression (optional)
+        if compressor.enabled:
+            async with log_request_time("6b. Context compression", t0):
+                contexts, compression = await compressor.compress(req.question, contexts)
+                if compression:
+                    logging.info(f"🗜️  Kept {compression['tokens_out']}/{compression['tokens_in']} context tokens ({compression['compression_ratio']:.0%})")
+
+        # Step 7: LLM generation, streamed token by token as the provider produces it
+        async for token in llm.stream_text(req.question, contexts, history=history):
+            yield token
+
+    # Identical questions in flight right now (same corpus and same prompt history, e.g.
+    # popular questions from fresh sessions) share one retrieval + generation and its token stream
+    flight_key = f"{corpus_version}:{normalize_query(req.question)}:{history_fingerprint(history)}"
+    if settings.SINGLEFLIGHT_ENABLED:
+        flight, leader = answer_flights.join(flight_key, produce_answer)
+        tokens = flight.stream()
+        if not leader:
+            logging.info("🔗 Identical question in flight - attaching to its answer stream")
+    else:
+        tokens = produce_answer()
+
+    answer_stream = AnswerStream(tokens, started_at=t0)
+
+    # Step 8: Save to database and cache (background, runs after the stream completes)
     async with log_request_time("8. Schedule background tasks", t0):
         background_tasks.add_task(
-            background_save_messages,
+            background_finalize_answer,
             session_id,
-            [('user', req.question), ('assistant', answer)]
+            req.question,
+            answer_stream,
+            query_embedding,
+            corpus_version
         )
         
         if len(last_messages) >= 6:
@@ -221,16 +276,8 @@ async def ask_question(
                 existing_summary=summary_text,
                 messages=last_messages
             )
-        
-        # Cache the answer
-        if (isinstance(answer, str) and 'Error' not in answer and 'No contexts' not in answer):
-            semantic_cache.set(req.session_id, req.question, answer, query_embedding)
     
-    # Final log
-    total_time = time.time() - t0
-    logging.info(f"🎉 REQUEST COMPLETE - Total time: {total_time:.2f}s")
-    
-    return StreamingResponse(chunk_text(answer), media_type="text/plain")
+    return StreamingResponse(answer_stream.stream(), media_type="text/plain")
     
 
 @app.get("/sessions/{session_id}/messages")
@@ -280,4 +327,17 @@ async def list_sessions(
         ]
     except Exception as e:
         logging.error(f"Error listing sessions: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.get("/cache/stats")
+async def cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Hit/miss counters of the in-process caches, plus compression and singleflight totals"""
+    return {
+        "rerank": retriever.reranker.cache_stats(),
+        "retrieval": retriever.retrieval_cache.stats(),
+        "query_embedding": query_embedder.stats(),
+        "global_answers": global_cache.stats(),
+        "semantic_l1": semantic_cache.stats(),
+        "compression": compressor.stats(),
+        "singleflight": answer_flights.stats(),
+    }
@@ -0,0 +1,71 @@
+import numpy as np
+from typing import List
+
+FLOAT32, FLOAT16, INT8 = 1, 2, 3
+_MODES = {"float32": FLOAT32, "float16": FLOAT16, "int8": INT8}
+
+
+class EmbeddingCodec:
+    """
+    Compact binary encoding for cached embeddings: one tag byte, then
+
+    - float32: raw little-endian float32 values (4 bytes/dim)
+    - float16: half precision (2 bytes/dim)
+    - int8: symmetric scalar quantization, a float32 scale followed by int8
+      values (1 byte/dim + 4)
+
+    Vectors are L2-normalised before encoding, so decoded rows can be
+    compared with a plain dot product. Blobs carry their own tag, so entries
+    written under another mode still decode.
+    """
+
+    def __init__(self, mode: str = "float32"):
+        if mode not in _MODES:
+            raise ValueError(f"Unknown embedding codec '{mode}', expected one of {list(_MODES)}")
+        self.mode = mode
+        self.tag = _MODES[mode]
+
+    @staticmethod
+    def normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def encode(self, vector) -> bytes:
+        vector = self.normalize(vector)
+        if self.tag == FLOAT32:
+            payload = vector.astype("<f4").tobytes()
+        elif self.tag == FLOAT16:
+            payload = vector.astype("<f2").tobytes()
+        else:
+            scale = float(np.abs(vector).max()) / 127 or 1.0
+            quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+            payload = np.float32(scale).astype("<f4").tobytes() + quantized.tobytes()
+        return bytes([self.tag]) + payload
+
+    def decode(self, blob: bytes) -> np.ndarray:
+        return self.decode_many([blob])[0]
+
+    @staticmethod
+    def _decode_rows(rows: np.ndarray) -> np.ndarray:
+        """rows: (n, blob_len) uint8, all with the same tag"""
+        tag, body = rows[0, 0], np.ascontiguousarray(rows[:, 1:])
+        if tag == FLOAT32:
+            return body.view("<f4").astype(np.float32)
+        if tag == FLOAT16:
+            return body.view("<f2").astype(np.float32)
+        if tag == INT8:
+            scales = np.ascontiguousarray(body[:, :4]).view("<f4").astype(np.float32)
+            return np.ascontiguousarray(body[:, 4:]).view(np.int8).astype(np.float32) * scales
+        raise ValueError(f"Unknown embedding codec tag {tag}")
+
+    def decode_many(self, blobs: List[bytes]) -> List[np.ndarray]:
+        """Vectorized decode: blobs sharing a tag and length are decoded as one matrix"""
+        groups = {}
+        for i, blob in enumerate(blobs):
+            groups.setdefault((blob[0], len(blob)), []).append(i)
+        decoded = [None] * len(blobs)
+        for indices in groups.values():
+            rows = np.frombuffer(b"".join(blobs[i] for i in indices), dtype=np.uint8).reshape(len(indices), -1)
+            for i, row in zip(indices, self._decode_rows(rows)):
+                decoded[i] = row
+        return decoded
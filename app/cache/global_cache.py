@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import json
+import time
+import numpy as np
+import redis.asyncio as aioredis
+from typing import Callable, Optional
+from app.cache.codec import EmbeddingCodec
+from app.cache.utils import is_standalone_question, normalize_query
+from app.cache.semantic_cache import get_redis
+from app.cache.vector_index import VectorIndex
+from app.core.config import settings
+from app.logger import logging
+
+
+class GlobalAnswerCache:
+    """
+    Cross-session semantic answer cache, keyed on question embedding + corpus version.
+
+    Entries live in Redis under `rag_global:{corpus_version}:*`: `vec` (hash of
+    EmbeddingCodec-encoded embeddings), `ans` (hash of JSON answers) and `log` (list of
+    entry hashes in insertion order). Each worker mirrors the vectors into an
+    in-process VectorIndex and tails `log` every GLOBAL_CACHE_REFRESH_SECONDS,
+    so a lookup is one ANN search plus a single HGET on a hit. A new corpus
+    version starts from an empty namespace. The cache only moves forward:
+    with `current_version` given, reads and writes for any other version
+    (e.g. a request that started before a re-ingestion) are ignored, and old
+    namespaces are left to expire by TTL. Follow-up questions that depend
+    on chat history are never read from or written to this tier.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis = None, current_version: Callable[[], str] = None):
+        self.enabled = settings.GLOBAL_CACHE_ENABLED
+        self.threshold = settings.GLOBAL_CACHE_THRESHOLD
+        self.ttl = int(settings.GLOBAL_CACHE_TTL_SECONDS)
+        self.refresh_interval = settings.GLOBAL_CACHE_REFRESH_SECONDS
+        self.redis = redis_client or get_redis()
+        self.current_version = current_version
+        self.codec = EmbeddingCodec(settings.SEMANTIC_CACHE_CODEC)
+        self.corpus_version = None
+        self.index = None
+        self._known = set()
+        self._log_offset = 0
+        self._log_head = None
+        self._synced_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(normalize_query(text).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _key(corpus_version: str, part: str) -> str:
+        return f"rag_global:{corpus_version}:{part}"
+
+    def _is_current(self, corpus_version: str) -> bool:
+        return self.current_version is None or corpus_version == self.current_version()
+
+    async def _sync(self, corpus_version: str, dimension: int):
+        """
+        Pulls entries other workers added since the last sync (and resets on a
+        new corpus version). The lock only guards the local state: Redis is read
+        without it, so lookups never queue behind a slow sync, and the new rows
+        are added only if the index was not reset in the meantime.
+        """
+        async with self._lock:
+            if corpus_version != self.corpus_version or self.index is None or self.index.dimension != dimension:
+                # Previous generations are not deleted here; their keys expire by TTL
+                self.corpus_version = corpus_version
+                self.index = VectorIndex(dimension)
+                self._known, self._log_offset, self._log_head, self._synced_at = set(), 0, None, 0.0
+            if time.monotonic() - self._synced_at < self.refresh_interval:
+                return
+            self._synced_at = time.monotonic()
+            index, offset, log_head = self.index, self._log_offset, self._log_head
+
+        log_key = self._key(corpus_version, "log")
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.llen(log_key)
+        pipe.lindex(log_key, 0)
+        length, head = await pipe.execute()
+        if length < offset or head != log_head:
+            # The log expired and was recreated (shorter, or with another first entry): reread it
+            offset = 0
+        new = [h for h in await self.redis.lrange(log_key, offset, -1)]
+        offset += len(new)
+        new = [h for h in dict.fromkeys(new) if h not in self._known]
+        rows = []
+        if new:
+            blobs = await self.redis.hmget(self._key(corpus_version, "vec"), new)
+            found = [(h, blob) for h, blob in zip(new, blobs) if blob is not None]
+            vectors = self.codec.decode_many([blob for _, blob in found])
+            rows = [(h, v) for (h, _), v in zip(found, vectors) if len(v) == dimension]
+
+        async with self._lock:
+            if self.index is not index:
+                # Reset to another version (or dimension) while Redis was being read
+                return
+            self._log_offset, self._log_head = offset, head
+            rows = [(h, v) for h, v in rows if h not in self._known]
+            if rows:
+                self.index.add([h for h, _ in rows], np.vstack([v for _, v in rows]))
+                self._known.update(h for h, _ in rows)
+                logging.info(f"Global cache: indexed {len(rows)} new entries ({len(self.index)} total)")
+
+    async def get(self, query: str, query_embedding: list, corpus_version: str) -> Optional[str]:
+        if not self.enabled or not is_standalone_question(query) or not self._is_current(corpus_version):
+            return None
+        try:
+            vector = EmbeddingCodec.normalize(query_embedding)
+            await self._sync(corpus_version, len(vector))
+            hits = self.index.search(vector, k=1)
+            if hits and hits[0][0] >= self.threshold:
+                score, entry = hits[0]
+                cached = await self.redis.hget(self._key(corpus_version, "ans"), entry)
+                if cached:
+                    self.hits += 1
+                    logging.info(f"Global cache HIT (score={score:.2f})")
+                    return json.loads(cached)["answer"]
+            self.misses += 1
+            return None
+        except Exception as e:
+            logging.error(f"GlobalAnswerCache.get error: {e}")
+            return None
+
+    async def set(self, query: str, answer: str, query_embedding: list, corpus_version: str):
+        if not self.enabled or not is_standalone_question(query):
+            return
+        if not self._is_current(corpus_version):
+            logging.info(f"GlobalAnswerCache: skipping write for superseded corpus version {corpus_version}")
+            return
+        try:
+            entry = self._hash(query).encode()
+            blob = self.codec.encode(query_embedding)
+            vector = self.codec.decode(blob)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(self._key(corpus_version, "vec"), entry, blob)
+            pipe.hset(self._key(corpus_version, "ans"), entry, json.dumps({"answer": answer, "query": query}))
+            for part in ("vec", "ans"):
+                pipe.expire(self._key(corpus_version, part), self.ttl)
+            created = (await pipe.execute())[0]
+            if created:
+                # Only new entries go on the log (repeats just refresh the answer), so it stays bounded
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.rpush(self._key(corpus_version, "log"), entry)
+                pipe.expire(self._key(corpus_version, "log"), self.ttl)
+                await pipe.execute()
+
+            await self._sync(corpus_version, len(vector))
+            async with self._lock:
+                if entry not in self._known and corpus_version == self.corpus_version:
+                    self.index.add([entry], vector)
+                    self._known.add(entry)
+            logging.info("Cached answer in GlobalAnswerCache")
+        except Exception as e:
+            logging.error(f"GlobalAnswerCache.set error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "corpus_version": self.corpus_version,
+            "entries": len(self.index) if self.index is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
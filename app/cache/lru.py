@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU with an optional per-entry TTL.
+
+    Least recently used entries are evicted past `max_size` entries, or past
+    `max_bytes` when a `sizeof(value)` function is given; expired entries
+    count as misses and are dropped when touched. Hit/miss counters are kept
+    for the /cache/stats endpoint.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_seconds: float = None,
+        max_bytes: int = None,
+        sizeof: Callable[[Any], int] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl_seconds or None
+        self.max_bytes = max_bytes if sizeof else None
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def _remove(self, key: Hashable):
+        value, _ = self._data.pop(key)
+        if self.sizeof:
+            self.bytes -= self.sizeof(value)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at)
+            if self.sizeof:
+                self.bytes += self.sizeof(value)
+            while len(self._data) > self.max_size or (self.max_bytes and self.bytes > self.max_bytes and len(self._data) > 1):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        with self._lock:
+            return self._remove(key) if key in self._data else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,65 @@
+import hashlib
+import json
+from typing import List, Optional, Tuple
+from app.cache.lru import LRUCache
+from app.cache.semantic_cache import get_redis
+from app.cache.utils import normalize_query
+from app.core.config import settings
+from app.logger import logging
+
+
+class RetrievalCache:
+    """
+    Caches hybrid_search results as ordered (chunk_id, score) lists, keyed by
+    normalized query + final_k + rerank candidates + corpus version.
+
+    Shared across sessions: a repeated question skips BM25, the dense query,
+    hydration and the cross-encoder even when its answer cannot be reused
+    (different chat history). An in-process LRU sits in front of Redis
+    (`rag_retrieval:{version}:...`), which other workers share.
+    """
+
+    def __init__(self, redis_client=None):
+        self.enabled = settings.RETRIEVAL_CACHE_ENABLED
+        self.ttl = int(settings.RETRIEVAL_CACHE_TTL_SECONDS)
+        self.l1 = LRUCache(max_size=settings.RETRIEVAL_CACHE_SIZE, ttl_seconds=self.ttl)
+        self.redis = redis_client if redis_client is not None else (get_redis() if settings.RETRIEVAL_CACHE_REDIS else None)
+        self.l2_hits = 0
+
+    @staticmethod
+    def _key(query: str, final_k: int, rerank_candidates: int, corpus_version: str) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode()).hexdigest()[:24]
+        return f"rag_retrieval:{corpus_version}:{digest}:{final_k}:{rerank_candidates}"
+
+    async def get(self, query: str, final_k: int, rerank_candidates: int, corpus_version: str) -> Optional[List[Tuple[str, float]]]:
+        if not self.enabled:
+            return None
+        key = self._key(query, final_k, rerank_candidates, corpus_version)
+        results = self.l1.get(key)
+        if results is not None or self.redis is None:
+            return results
+        try:
+            cached = await self.redis.get(key)
+            if cached:
+                results = [tuple(item) for item in json.loads(cached)]
+                self.l1.set(key, results)
+                self.l2_hits += 1
+            return results
+        except Exception as e:
+            logging.error(f"RetrievalCache.get error: {e}")
+            return None
+
+    async def set(self, query: str, final_k: int, rerank_candidates: int, corpus_version: str, results: List[Tuple[str, float]]):
+        if not self.enabled or not results:
+            return
+        key = self._key(query, final_k, rerank_candidates, corpus_version)
+        self.l1.set(key, list(results))
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(key, json.dumps(results), ex=self.ttl)
+        except Exception as e:
+            logging.error(f"RetrievalCache.set error: {e}")
+
+    def stats(self) -> dict:
+        return {**self.l1.stats(), "enabled": self.enabled, "l2_hits": self.l2_hits}
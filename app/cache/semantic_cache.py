@@ -1,85 +1,245 @@
+import asyncio
 import numpy as np
-import redis
+import redis.asyncio as aioredis
 import json
 import hashlib
-from typing import Optional
-from app.retrieval.embedding_client import EuriEmbeddingClient
+import uuid
+from typing import Callable, Dict, List, Optional
+from app.cache.codec import EmbeddingCodec
+from app.cache.lru import LRUCache
+from app.core.config import settings
 from app.logger import logging
 
-class SemanticCache:
-    def __init__(self, similarity_threshold: float = 0.88):  # Changed from 0.85 to 0.88
-        self.embedder = EuriEmbeddingClient()
-        self.threshold = similarity_threshold
 
-        self.redis = redis.Redis(
-            host="localhost",
-            port=6379,
-            decode_responses=True
+_redis = None
+
+
+def get_redis() -> aioredis.Redis:
+    """The process-wide async Redis client; every cache tier shares its one connection pool"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.Redis.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=False,
         )
+    return _redis
 
-    @staticmethod
-    def _cosine_similarity(a, b):
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+
+class SessionEntries:
+    """One session's cached questions as a stacked unit-vector matrix; answers are filled in on hits"""
+
+    def __init__(self, hashes: List[bytes] = None, matrix: np.ndarray = None, answers: Dict[bytes, bytes] = None):
+        self.hashes = hashes or []
+        self.matrix = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        self.answers = answers or {}
+
+    @classmethod
+    def from_vectors(cls, fields: Dict[bytes, bytes], codec: EmbeddingCodec) -> "SessionEntries":
+        if not fields:
+            return cls()
+        hashes = list(fields)
+        vectors = codec.decode_many([fields[h] for h in hashes])
+        # Mixed embedding sizes (model change): keep the most recent size only
+        size = len(vectors[-1])
+        rows = [(h, v) for h, v in zip(hashes, vectors) if len(v) == size]
+        return cls([h for h, _ in rows], np.vstack([v for _, v in rows]))
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + sum(len(answer) for answer in self.answers.values())
+
+    def add(self, entry: bytes, vector: np.ndarray, answer: bytes = None) -> "SessionEntries":
+        """Copy with one entry added/replaced; L1 values are never mutated in place"""
+        hashes, matrix, answers = list(self.hashes), self.matrix, dict(self.answers)
+        if vector is not None:
+            if not hashes or matrix.shape[1] != len(vector):
+                hashes, matrix, answers = [], np.zeros((0, len(vector)), dtype=np.float32), {}
+            if entry in hashes:
+                matrix = matrix.copy()
+                matrix[hashes.index(entry)] = vector
+            else:
+                hashes.append(entry)
+                matrix = np.vstack([matrix, vector[None, :]])
+        if answer is not None:
+            answers[entry] = answer
+        return SessionEntries(hashes, matrix, answers)
+
+    def best(self, vector: np.ndarray):
+        if not self.hashes or self.matrix.shape[1] != len(vector):
+            return None, 0.0
+        scores = self.matrix @ vector
+        best = int(np.argmax(scores))
+        return self.hashes[best], float(scores[best])
+
+
+class SemanticCache:
+    """
+    Two-tier per-session semantic answer cache.
+
+    L2 is Redis (async, pooled): per corpus version and session,
+    `rag_cache:{version}:{session_id}:vec` maps question hash -> EmbeddingCodec
+    bytes (float16 by default) and `...:ans` maps question hash -> JSON answer, so a
+    similarity scan only reads and decodes vectors. L1 is an in-process TTL
+    LRU of SessionEntries, so a hot session is checked with one
+    matrix-vector product and no network call. Writes go through to
+    both tiers and are announced on a pub/sub channel; other workers drop
+    that session from their L1 and reload it from Redis on next use. A
+    generation counter keeps a Redis read that raced a write or an
+    invalidation from putting stale entries back into L1.
+    A new corpus version starts from empty keys; the old ones expire by TTL.
+    With `current_version` given, reads and writes for any other version are
+    ignored, so a late write from a request that began before a re-ingestion
+    cannot switch L1 back to the old corpus.
+    """
+    TTL_SECONDS = 60 * 60 * 24  # 24 hours, refreshed whenever the session caches an answer
+    CHANNEL = "rag_cache:invalidate"
+
+    def __init__(self, similarity_threshold: float = 0.88, redis_client: aioredis.Redis = None,  # Changed from 0.85 to 0.88
+                 current_version: Callable[[], str] = None):
+        self.threshold = similarity_threshold
+        self.redis = redis_client or get_redis()
+        self.current_version = current_version
+        self.codec = EmbeddingCodec(settings.SEMANTIC_CACHE_CODEC)
+        self.l1 = LRUCache(
+            max_size=settings.SEMANTIC_L1_MAX_SESSIONS,
+            ttl_seconds=settings.SEMANTIC_L1_TTL_SECONDS,
+            max_bytes=int(settings.SEMANTIC_L1_MAX_MB * 1024 * 1024),
+            sizeof=lambda entries: entries.nbytes,
+        )
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.corpus_version = None
+        self._listener = None
+        # Bumped by every write/invalidation; an L1 fill whose Redis read raced one is dropped
+        self._generation = 0
 
     @staticmethod
     def _hash(text: str) -> str:
         return hashlib.sha256(text.encode()).hexdigest()[:16]
 
-    def get(self, session_id: str, query: str, query_embedding: list) -> Optional[str]:
+    @staticmethod
+    def _key(corpus_version: str, session_id: str, part: str) -> str:
+        return f"rag_cache:{corpus_version}:{session_id}:{part}"
+
+    def _is_current(self, corpus_version: str) -> bool:
+        return self.current_version is None or corpus_version == self.current_version()
+
+    def _use_version(self, corpus_version: str):
+        # L1 entries of the previous corpus can never be hit again, free them
+        if corpus_version != self.corpus_version:
+            if self.corpus_version is not None:
+                self._generation += 1
+                self.l1.clear()
+            self.corpus_version = corpus_version
+
+    def start(self):
+        """Starts the pub/sub invalidation listener on the running loop (idempotent)"""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.ensure_future(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                logging.info(f"SemanticCache worker {self.worker_id} listening for invalidations")
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    worker_id, corpus_version, session_id = message["data"].decode().split(":", 2)
+                    if worker_id != self.worker_id:
+                        self._generation += 1
+                        self.l1.pop((corpus_version, session_id))
+            except asyncio.CancelledError:
+                await pubsub.close()
+                raise
+            except Exception as e:
+                # Missed messages could leave stale L1 entries: start over cold
+                logging.error(f"SemanticCache invalidation listener error: {e}, clearing L1 and resubscribing")
+                self._generation += 1
+                self.l1.clear()
+                await pubsub.close()
+                await asyncio.sleep(1)
+
+    async def _entries(self, corpus_version: str, session_id: str) -> SessionEntries:
+        entries = self.l1.get((corpus_version, session_id))
+        if entries is None:
+            # L1 miss: all cached vectors of this session in one round trip, no answer text
+            generation = self._generation
+            fields = await self.redis.hgetall(self._key(corpus_version, session_id, "vec"))
+            entries = SessionEntries.from_vectors(fields, self.codec)
+            if generation == self._generation:
+                self.l1.set((corpus_version, session_id), entries)
+        return entries
+
+    async def get(self, session_id: str, query: str, query_embedding: list, corpus_version: str = "0") -> Optional[str]:
         try:
-            # Search ALL cached questions for this session
-            pattern = f"rag_cache:{session_id}:*"
-            keys = self.redis.keys(pattern)
-            
-            if not keys:
+            if not self._is_current(corpus_version):
                 return None
-            
-            best_score = 0
-            best_answer = None
-            
-            # Check similarity against all cached questions in this session
-            for key in keys:
-                cached = self.redis.get(key)
-                if not cached:
-                    continue
-                    
-                cached_data = json.loads(cached)
-                score = self._cosine_similarity(query_embedding, cached_data["embedding"])
-                
-                if score > best_score:
-                    best_score = score
-                    best_answer = cached_data["answer"]
-            
-            # Return if above threshold
-            if best_score >= self.threshold:
-                logging.info(f"Semantic cache HIT (score={best_score:.2f})")
-                return best_answer
-            
+            self.start()
+            self._use_version(corpus_version)
+            entries = await self._entries(corpus_version, session_id)
+            best, best_score = entries.best(EmbeddingCodec.normalize(query_embedding))
+            if best is not None and best_score >= self.threshold:
+                cached = entries.answers.get(best)
+                if cached is None:
+                    # Only the winning answer is fetched, then kept in L1
+                    generation = self._generation
+                    cached = await self.redis.hget(self._key(corpus_version, session_id, "ans"), best)
+                    if cached is not None and generation == self._generation:
+                        self.l1.set((corpus_version, session_id), entries.add(best, None, cached))
+                if cached is not None:
+                    logging.info(f"Semantic cache HIT (score={best_score:.2f})")
+                    return json.loads(cached)["answer"]
+
             logging.info(f"Semantic cache MISS (best score={best_score:.2f})")
             return None
-            
+
         except Exception as e:
             logging.error(f"SemanticCache.get error: {e}")
             return None
 
-    def set(self, session_id: str, query: str, answer: str, query_embedding: list):
+    async def set(self, session_id: str, query: str, answer: str, query_embedding: list, corpus_version: str = "0"):
         try:
+            if not self._is_current(corpus_version):
+                logging.info(f"SemanticCache: skipping write for superseded corpus version {corpus_version}")
+                return
+            self.start()
+            self._use_version(corpus_version)
             query_hash = self._hash(query)
-            key = f"rag_cache:{session_id}:{query_hash}"
+            blob = self.codec.encode(query_embedding)
 
-            payload = {
-                "embedding": query_embedding,
+            payload = json.dumps({
                 "answer": answer,
                 "query": query  # Added: Store original query for debugging
-            }
+            }).encode()
+
+            # Write-through: vector, answer and the session TTL in one round trip, then announce it.
+            # The generation moves on both sides of the write so no concurrent L1 fill survives it
+            self._generation += 1
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(self._key(corpus_version, session_id, "vec"), query_hash, blob)
+            pipe.hset(self._key(corpus_version, session_id, "ans"), query_hash, payload)
+            for part in ("vec", "ans"):
+                pipe.expire(self._key(corpus_version, session_id, part), self.TTL_SECONDS)
+            pipe.publish(self.CHANNEL, f"{self.worker_id}:{corpus_version}:{session_id}")
+            await pipe.execute()
+            self._generation += 1
 
-            self.redis.set(
-                key,
-                json.dumps(payload),
-                ex=60 * 60 * 24  # 24 hours TTL
-            )
+            entries = self.l1.get((corpus_version, session_id))
+            if entries is not None:
+                # Same decoded vector other workers will load from Redis
+                self.l1.set((corpus_version, session_id), entries.add(query_hash.encode(), self.codec.decode(blob), payload))
 
             logging.info("Cached answer in SemanticCache")
 
         except Exception as e:
-            logging.error(f"SemanticCache.set error: {e}")
\ No newline at end of file
+            logging.error(f"SemanticCache.set error: {e}")
+
+    def stats(self) -> dict:
+        return {**self.l1.stats(), "worker_id": self.worker_id, "corpus_version": self.corpus_version}
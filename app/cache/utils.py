@@ -0,0 +1,34 @@
+import hashlib
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a question, used as a cache key"""
+    return _WHITESPACE.sub(" ", text or "").strip().lower()
+
+
+# Pronouns and references that only make sense against earlier turns
+_FOLLOW_UP = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|she|him|his|her|"
+    r"above|previous|earlier|former|latter|same|else|again|what about|how about)\b"
+)
+
+
+def is_standalone_question(text: str) -> bool:
+    """
+    Heuristic: False for questions that look like follow-ups ("what about its
+    side effects?", "explain more"), whose answer depends on chat history
+    and must not be shared across sessions.
+    """
+    normalized = normalize_query(text)
+    return len(normalized.split()) >= 4 and not _FOLLOW_UP.search(normalized)
+
+
+def history_fingerprint(history: list) -> str:
+    """Short stable digest of the chat history (summary + recent messages) that goes into the prompt"""
+    digest = hashlib.sha256()
+    for msg in history or []:
+        digest.update(f"{msg['role']}\x1f{msg['content']}\x1e".encode())
+    return digest.hexdigest()[:16]
@@ -0,0 +1,55 @@
+import numpy as np
+from typing import List, Tuple
+from app.logger import logging
+
+
+class VectorIndex:
+    """
+    Append-only inner-product index over unit vectors, returning (score, key).
+
+    Uses a faiss HNSW graph when faiss is installed and exact numpy search
+    otherwise (a single matrix-vector product, fine up to ~10^5 vectors).
+    """
+
+    def __init__(self, dimension: int, use_faiss: bool = True, hnsw_m: int = 32):
+        self.dimension = dimension
+        self.keys: List[str] = []
+        self._faiss = None
+        self._matrix = np.zeros((0, dimension), dtype=np.float32)
+        self._pending: List[np.ndarray] = []
+        if use_faiss:
+            try:
+                import faiss
+                self._faiss = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            except ImportError:
+                logging.info("faiss not installed, VectorIndex falls back to exact numpy search")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(keys), self.dimension)
+        if not keys:
+            return
+        self.keys.extend(keys)
+        if self._faiss is not None:
+            self._faiss.add(vectors)
+        else:
+            # Stacked lazily so a burst of adds costs one copy
+            self._pending.append(vectors)
+
+    def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[float, str]]:
+        if not self.keys:
+            return []
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, self.dimension)
+        if self._faiss is not None:
+            scores, rows = self._faiss.search(vector, k)
+            return [(float(score), self.keys[row]) for score, row in zip(scores[0], rows[0]) if row >= 0]
+        if self._pending:
+            self._matrix = np.vstack([self._matrix] + self._pending)
+            self._pending = []
+        scores = self._matrix @ vector[0]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[row]), self.keys[row]) for row in top]
@@ -17,6 +17,71 @@ class Settings:
     PINECONE_INDEX_NAME: str | None
     AZURE_BLOB_CONNECTION_STRING: str | None
     AZURE_BLOB_CONTAINER: str | None
+    VECTOR_STORE_BACKEND: str
+    LOCAL_VECTOR_STORE_PATH: str
+    BM25_INDEX_PATH: str
+    BM25_MAX_SEGMENTS: int
+    CHUNK_STORE_PATH: str
+    CHUNK_STORE_COMPRESS: bool
+    FUSION_METHOD: str
+    RRF_K: int
+    BM25_WEIGHT: float
+    DENSE_WEIGHT: float
+    RETRIEVAL_CANDIDATES: int
+    RERANK_CANDIDATES: int
+    RERANK_BATCH_MAX_SIZE: int
+    RERANK_BATCH_MAX_WAIT_MS: float
+    RERANKER_MODEL: str
+    RERANKER_BACKEND: str
+    ONNX_MODEL_DIR: str
+    ONNX_NUM_THREADS: int
+    ONNX_PARITY_MAX_ABS_DIFF: float
+    ONNX_PARITY_TOP_K: int
+    ONNX_PARITY_MIN_AGREEMENT: float
+    TOKEN_CACHE_PATH: str
+    RERANK_CACHE_SIZE: int
+    RERANK_CACHE_TTL_SECONDS: float
+    EMBEDDING_MODEL: str
+    EMBEDDING_DIMENSION: int
+    EMBEDDING_CACHE_PATH: str
+    QUERY_EMBED_BATCH_MAX_SIZE: int
+    QUERY_EMBED_BATCH_MAX_WAIT_MS: float
+    QUERY_EMBED_MAX_CONCURRENT_BATCHES: int
+    QUERY_EMBED_CACHE_SIZE: int
+    QUERY_EMBED_CACHE_MAX_MB: float
+    QUERY_EMBED_CACHE_TTL_SECONDS: float
+    CORPUS_VERSION_PATH: str
+    CORPUS_VERSION_REFRESH_SECONDS: float
+    REDIS_URL: str
+    REDIS_MAX_CONNECTIONS: int
+    SEMANTIC_CACHE_CODEC: str
+    SEMANTIC_L1_MAX_SESSIONS: int
+    SEMANTIC_L1_MAX_MB: float
+    SEMANTIC_L1_TTL_SECONDS: float
+    GLOBAL_CACHE_ENABLED: bool
+    GLOBAL_CACHE_THRESHOLD: float
+    GLOBAL_CACHE_TTL_SECONDS: float
+    GLOBAL_CACHE_REFRESH_SECONDS: float
+    LLM_MODEL: str
+    LLM_TIMEOUT_SECONDS: float
+    LLM_CONNECT_TIMEOUT_SECONDS: float
+    LLM_MAX_CONNECTIONS: int
+    LLM_MAX_ANSWER_TOKENS: int
+    PROMPT_TOKEN_BUDGET: int
+    PROMPT_HISTORY_MAX_TOKENS: int
+    CONTEXT_COMPRESSION_ENABLED: bool
+    CONTEXT_COMPRESSION_RATIO: float
+    CONTEXT_COMPRESSION_MAX_TOKENS: int
+    CONTEXT_COMPRESSION_MIN_SENTENCES: int
+    SINGLEFLIGHT_ENABLED: bool
+    RETRIEVAL_CACHE_ENABLED: bool
+    RETRIEVAL_CACHE_REDIS: bool
+    RETRIEVAL_CACHE_SIZE: int
+    RETRIEVAL_CACHE_TTL_SECONDS: float
+    EMBED_BATCH_MAX_TOKENS: int
+    EMBED_BATCH_MAX_SIZE: int
+    EMBED_MAX_CONCURRENCY: int
+    EMBED_MAX_RETRIES: int
 
     def __init__(self) -> None:
         try:
@@ -28,14 +93,118 @@ class Settings:
             self.AZURE_BLOB_CONNECTION_STRING = os.getenv("AZURE_BLOB_CONNECTION_STRING")
             self.AZURE_BLOB_CONTAINER = os.getenv("AZURE_BLOB_CONTAINER")
 
+            # Dense retrieval backend: "pinecone" (remote) or "local" (in-process, mmap'd from disk)
+            self.VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+            self.LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", "vector_store")
+
+            # Segmented BM25 index directory; more segments than this triggers a background merge
+            self.BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "bm25_index")
+            self.BM25_MAX_SEGMENTS = int(os.getenv("BM25_MAX_SEGMENTS", "8"))
+
+            # Local chunk text/metadata store used to hydrate retrieved ids
+            self.CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "chunk_store")
+            self.CHUNK_STORE_COMPRESS = os.getenv("CHUNK_STORE_COMPRESS", "true").lower() == "true"
+
+            # Hybrid fusion: "rrf" (weighted reciprocal rank) or "linear" (min-max normalised scores)
+            self.FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf").lower()
+            self.RRF_K = int(os.getenv("RRF_K", "60"))
+            self.BM25_WEIGHT = float(os.getenv("BM25_WEIGHT", "1.0"))
+            self.DENSE_WEIGHT = float(os.getenv("DENSE_WEIGHT", "1.0"))
+            # Hits pulled from each retriever, and how many fused hits the cross-encoder scores
+            self.RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+            self.RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "8"))
+            # Cross-request rerank micro-batching: flush at this many pairs or after this wait
+            self.RERANK_BATCH_MAX_SIZE = int(os.getenv("RERANK_BATCH_MAX_SIZE", "64"))
+            self.RERANK_BATCH_MAX_WAIT_MS = float(os.getenv("RERANK_BATCH_MAX_WAIT_MS", "5"))
+
+            # Cross-encoder inference: "torch" (sentence-transformers) or "onnx" (int8 onnxruntime)
+            self.RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+            self.RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch").lower()
+            self.ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models")
+            self.ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0"))
+            # Parity gate for the int8 export: max |torch - onnx| score and share of queries whose top-k agrees
+            self.ONNX_PARITY_MAX_ABS_DIFF = float(os.getenv("ONNX_PARITY_MAX_ABS_DIFF", "0.05"))
+            self.ONNX_PARITY_TOP_K = int(os.getenv("ONNX_PARITY_TOP_K", "1"))
+            self.ONNX_PARITY_MIN_AGREEMENT = float(os.getenv("ONNX_PARITY_MIN_AGREEMENT", "1.0"))
+            # Reranker passage token ids built at ingestion, one subdirectory per model
+            self.TOKEN_CACHE_PATH = os.getenv("TOKEN_CACHE_PATH", "token_cache")
+            # In-process cache of cross-encoder scores per (query, chunk); 0 TTL = no expiry
+            self.RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+            self.RERANK_CACHE_TTL_SECONDS = float(os.getenv("RERANK_CACHE_TTL_SECONDS", "3600"))
+
+            # Embeddings; ingestion packs texts into token-aware batches, several in flight at once
+            self.EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+            self.EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+            # Content-addressed (chunk hash, model, dimension) -> vector cache used by ingestion
+            self.EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache")
+            # /ask query embeddings: concurrent questions are coalesced into one API call
+            self.QUERY_EMBED_BATCH_MAX_SIZE = int(os.getenv("QUERY_EMBED_BATCH_MAX_SIZE", "32"))
+            self.QUERY_EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_EMBED_BATCH_MAX_WAIT_MS", "10"))
+            self.QUERY_EMBED_MAX_CONCURRENT_BATCHES = int(os.getenv("QUERY_EMBED_MAX_CONCURRENT_BATCHES", "4"))
+            # In-process normalized question -> embedding LRU, bounded by entries and memory
+            self.QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "20000"))
+            self.QUERY_EMBED_CACHE_MAX_MB = float(os.getenv("QUERY_EMBED_CACHE_MAX_MB", "64"))
+            self.QUERY_EMBED_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBED_CACHE_TTL_SECONDS", "86400"))
+
+            # Corpus version stamped by ingestion; all cache keys are namespaced by it
+            self.CORPUS_VERSION_PATH = os.getenv("CORPUS_VERSION_PATH", "corpus_version.json")
+            self.CORPUS_VERSION_REFRESH_SECONDS = float(os.getenv("CORPUS_VERSION_REFRESH_SECONDS", "5"))
+
+            # Semantic cache: async pooled Redis (L2) behind an in-process per-session L1
+            self.REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            self.REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+            # Cached question embeddings: "float32", "float16" or "int8" (1536 dims: 6 KB / 3 KB / 1.5 KB)
+            self.SEMANTIC_CACHE_CODEC = os.getenv("SEMANTIC_CACHE_CODEC", "float32").lower()
+            self.SEMANTIC_L1_MAX_SESSIONS = int(os.getenv("SEMANTIC_L1_MAX_SESSIONS", "10000"))
+            self.SEMANTIC_L1_MAX_MB = float(os.getenv("SEMANTIC_L1_MAX_MB", "256"))
+            self.SEMANTIC_L1_TTL_SECONDS = float(os.getenv("SEMANTIC_L1_TTL_SECONDS", "300"))
+
+            # Cross-session answer cache for standalone questions; stricter threshold than the per-session one
+            self.GLOBAL_CACHE_ENABLED = os.getenv("GLOBAL_CACHE_ENABLED", "false").lower() == "true"
+            self.GLOBAL_CACHE_THRESHOLD = float(os.getenv("GLOBAL_CACHE_THRESHOLD", "0.95"))
+            self.GLOBAL_CACHE_TTL_SECONDS = float(os.getenv("GLOBAL_CACHE_TTL_SECONDS", "86400"))
+            self.GLOBAL_CACHE_REFRESH_SECONDS = float(os.getenv("GLOBAL_CACHE_REFRESH_SECONDS", "5"))
+
+            # Chat completions: one shared async connection pool, per-call timeouts
+            self.LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4.1-nano")
+            self.LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+            self.LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+            self.LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+
+            # Prompt packing: budget covers prompt + answer, history is capped, contexts get the rest
+            self.LLM_MAX_ANSWER_TOKENS = int(os.getenv("LLM_MAX_ANSWER_TOKENS", "600"))
+            self.PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+            self.PROMPT_HISTORY_MAX_TOKENS = int(os.getenv("PROMPT_HISTORY_MAX_TOKENS", "400"))
+
+            # Optional extractive compression: keep the best-scoring sentences of the retrieved contexts
+            self.CONTEXT_COMPRESSION_ENABLED = os.getenv("CONTEXT_COMPRESSION_ENABLED", "false").lower() == "true"
+            self.CONTEXT_COMPRESSION_RATIO = float(os.getenv("CONTEXT_COMPRESSION_RATIO", "0.5"))
+            self.CONTEXT_COMPRESSION_MAX_TOKENS = int(os.getenv("CONTEXT_COMPRESSION_MAX_TOKENS", "0"))
+            self.CONTEXT_COMPRESSION_MIN_SENTENCES = int(os.getenv("CONTEXT_COMPRESSION_MIN_SENTENCES", "3"))
+
+            # Concurrent identical questions share one retrieval + LLM stream (per worker)
+            self.SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+            # Ranked chunk ids per normalized query + corpus version, shared across sessions (L1 + Redis)
+            self.RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+            self.RETRIEVAL_CACHE_REDIS = os.getenv("RETRIEVAL_CACHE_REDIS", "true").lower() == "true"
+            self.RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "20000"))
+            self.RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+
+            self.EMBED_BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "100000"))
+            self.EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "512"))
+            self.EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "8"))
+            self.EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
             # Simple validation – fail fast if critical things are missing
             missing = []
             if not self.OPENAI_API_KEY:
                 missing.append("OPENAI_API_KEY")
-            if not self.PINECONE_API_KEY:
-                missing.append("PINECONE_API_KEY")
-            if not self.PINECONE_INDEX_NAME:
-                missing.append("PINECONE_INDEX_NAME")
+            if self.VECTOR_STORE_BACKEND == "pinecone":
+                if not self.PINECONE_API_KEY:
+                    missing.append("PINECONE_API_KEY")
+                if not self.PINECONE_INDEX_NAME:
+                    missing.append("PINECONE_INDEX_NAME")
 
             if missing:
                 print(f"[Settings] WARNING: Missing env vars: {', '.join(missing)}")
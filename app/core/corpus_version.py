@@ -0,0 +1,55 @@
+import hashlib
+import json
+import os
+import time
+from typing import List, Optional
+from app.core.config import settings
+from app.logger import logging
+
+
+def stamp_corpus_version(chunk_ids: List[str], path: str = None, **details) -> str:
+    """
+    Called at the end of ingestion. The version is derived from the indexed
+    chunk ids (content hashes), so re-ingesting an unchanged corpus keeps the
+    version and every cache stays warm, while any change yields a new one.
+    """
+    path = path or settings.CORPUS_VERSION_PATH
+    digest = hashlib.sha256("\n".join(sorted(set(chunk_ids))).encode("utf-8")).hexdigest()[:16]
+    stamp = {"version": digest, "num_chunks": len(set(chunk_ids)), "stamped_at": int(time.time()), **details}
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(stamp, f)
+    os.replace(path + ".tmp", path)
+    logging.info(f"Stamped corpus version {digest} ({stamp['num_chunks']} chunks)")
+    return digest
+
+
+class CorpusVersion:
+    """
+    Serving-side view of the stamp: re-reads the file at most every
+    CORPUS_VERSION_REFRESH_SECONDS (one stat call), so a new ingestion is
+    picked up by every worker without a restart.
+    """
+
+    def __init__(self, path: str = None, refresh_seconds: float = None):
+        self.path = path or settings.CORPUS_VERSION_PATH
+        self.refresh_seconds = settings.CORPUS_VERSION_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._version = None
+        self._mtime = None
+        self._checked_at = float("-inf")
+
+    def current(self) -> Optional[str]:
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_seconds:
+            return self._version
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self._mtime:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._version = json.load(f)["version"]
+                self._mtime = mtime
+        except FileNotFoundError:
+            self._version, self._mtime = None, None
+        except Exception as e:
+            logging.error(f"Error reading corpus version from {self.path}: {e}")
+        return self._version
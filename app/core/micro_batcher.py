@@ -0,0 +1,108 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, List
+from app.logger import logging
+
+
+class MicroBatcher:
+    """
+    Coalesces items submitted by concurrent coroutines into batches.
+
+    A batch is flushed when it reaches `max_batch_size` items or `max_wait_ms`
+    after its first item arrived, whichever comes first. `process_batch`
+    receives the concatenated items and must return one result per item;
+    results are scattered back to the awaiting callers in order. At most
+    `max_concurrent_batches` batches run at once. While all of them are busy,
+    nothing is dispatched: new requests stay pending and accumulate, and
+    whatever has gathered goes out (in batches of up to `max_batch_size`)
+    as soon as a running batch finishes.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List], Awaitable[List]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5,
+        max_concurrent_batches: int = 1,
+        name: str = "micro-batcher",
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_batches = max_concurrent_batches
+        self.name = name
+        self._pending = deque()
+        self._pending_size = 0
+        self._timer = None
+        self._running = 0
+        self._tasks = set()
+
+    async def submit(self, items: List) -> List:
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((items, future))
+        self._pending_size += len(items)
+
+        if self._pending_size >= self.max_batch_size:
+            self._flush(full_only=True)
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self, full_only: bool = False):
+        """Sends pending requests out as batches; with full_only, a partial tail keeps waiting"""
+        if not full_only and self._timer is not None:
+            self._timer.cancel()
+        if not full_only:
+            self._timer = None
+        while (
+            self._pending
+            and self._running < self.max_concurrent_batches
+            and (not full_only or self._pending_size >= self.max_batch_size)
+        ):
+            batch, size = [], 0
+            # Whole requests only; a single oversized request still goes out as one batch
+            while self._pending and (not batch or size + len(self._pending[0][0]) <= self.max_batch_size):
+                items, future = self._pending.popleft()
+                batch.append((items, future))
+                size += len(items)
+            self._pending_size -= size
+            self._running += 1
+            # Keep a reference so the task is not garbage collected mid-flight
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            await self._process(batch)
+        finally:
+            self._running -= 1
+            # Requests that piled up while every slot was busy go out now
+            if self._pending:
+                self._flush()
+
+    async def _process(self, batch):
+        live = [(items, future) for items, future in batch if not future.cancelled()]
+        if not live:
+            return
+        flat = [item for items, _ in live for item in items]
+        try:
+            results = await self.process_batch(flat)
+            if len(results) != len(flat):
+                raise RuntimeError(f"{self.name}: expected {len(flat)} results, got {len(results)}")
+        except Exception as e:
+            logging.error(f"{self.name} batch of {len(flat)} failed: {e}")
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logging.info(f"{self.name}: processed {len(flat)} item(s) from {len(live)} request(s) in one batch")
+        offset = 0
+        for items, future in live:
+            if not future.done():
+                future.set_result(list(results[offset:offset + len(items)]))
+            offset += len(items)
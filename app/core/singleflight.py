@@ -0,0 +1,120 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Tuple
+from app.logger import logging
+
+
+class FlightCancelled(Exception):
+    """Raised to subscribers still attached when a flight's task was cancelled from outside"""
+
+
+class Flight:
+    """
+    One in-flight streamed computation. Tokens are buffered, so a caller that
+    attaches late first replays what was already produced, then follows live.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self.cancelled = False
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # Wake current waiters; later waiters get a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, token: str):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, error: Exception = None):
+        self.done, self.error = True, error
+        self._notify()
+
+    def cancel(self):
+        """Stops the work; a cancelled flight never takes new subscribers"""
+        self.cancelled = True
+        if self.task is not None:
+            self.task.cancel()
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Replays buffered tokens then follows the flight; re-raises its error at the end"""
+        sent = 0
+        try:
+            while True:
+                while sent < len(self.tokens):
+                    yield self.tokens[sent]
+                    sent += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            # Nobody is listening anymore (all clients went away): stop the work
+            if self.subscribers <= 0 and not self.done and not self.cancelled:
+                logging.info(f"SingleFlight: last subscriber left, cancelling {self.key}")
+                self.cancel()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent streamed computations.
+
+    The first caller for a key starts `produce()` (an async token iterator)
+    as its own task; callers arriving while it runs attach to the same Flight
+    and receive the same tokens. The task is independent of any one caller,
+    so the first client disconnecting does not cut off the others. It is
+    cancelled only once every subscriber has gone, and a cancelled flight is
+    never joined again, so the next caller starts a fresh one. Finished
+    flights are forgotten at once; later repeats are expected to hit the
+    answer caches.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def join(self, key: str, produce: Callable[[], AsyncIterator[str]]) -> Tuple[Flight, bool]:
+        """Returns (flight, leader); `produce` is only called when no flight is running for key"""
+        flight = self._flights.get(key)
+        if flight is not None and not flight.done and not flight.cancelled:
+            flight.subscribers += 1
+            self.coalesced += 1
+            logging.info(f"{self.name}: attached to in-flight {key} ({flight.subscribers} subscribers)")
+            return flight, False
+
+        flight = Flight(key)
+        flight.subscribers = 1
+        self._flights[key] = flight
+        self.started += 1
+        flight.task = asyncio.ensure_future(self._run(flight, produce))
+        return flight, True
+
+    async def _run(self, flight: Flight, produce: Callable[[], AsyncIterator[str]]):
+        try:
+            async for token in produce():
+                flight.push(token)
+            flight.finish()
+        except asyncio.CancelledError:
+            # Subscribers still attached (external cancel) get a regular error, never CancelledError
+            flight.cancelled = True
+            flight.finish(FlightCancelled(f"{self.name}: flight {flight.key} was cancelled"))
+            raise
+        except Exception as e:
+            logging.error(f"{self.name}: flight {flight.key} failed: {e}")
+            flight.finish(e)
+        finally:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
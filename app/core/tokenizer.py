@@ -0,0 +1,44 @@
+import re
+from typing import List
+from functools import lru_cache
+from app.logger import logging
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken unavailable ({e}), falling back to ~4 chars per token estimate")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count under cl100k_base (the OpenAI embedding/chat vocabulary), estimated if tiktoken is missing"""
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+_LINE_BREAK = re.compile(r"\s*\n\s*")
+_SENTENCE_END = re.compile(r"(?<=[.!?])[ \t]+(?=[\"'(\[]?[A-Z0-9•\-])")
+_ABBREVIATION = re.compile(r"(?:\b(?:Dr|Mr|Mrs|Ms|Prof|St|Sr|Jr|vs|etc|No|Fig|approx|[A-Za-z]))\.$")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Splits on line breaks, then on sentence-final punctuation followed by a capital/digit/bullet"""
+    sentences = []
+    for line in _LINE_BREAK.split(text):
+        start = len(sentences)
+        for piece in _SENTENCE_END.split(line):
+            piece = piece.strip()
+            if not piece:
+                continue
+            # "Dr. Smith" is one sentence, but an abbreviation never joins across a line break
+            if len(sentences) > start and _ABBREVIATION.search(sentences[-1]):
+                sentences[-1] = f"{sentences[-1]} {piece}"
+            else:
+                sentences.append(piece)
+    return sentences
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Dict, List
 import hashlib
 
 
@@ -31,3 +31,20 @@ class Chunk:
         return self.id
 
 
+@dataclass
+class VectorMatch:
+    """
+    Single dense-retrieval hit, shaped like a Pinecone match
+    """
+    id: str
+    score: float
+    metadata: Dict = field(default_factory=dict)
+
+
+@dataclass
+class VectorQueryResult:
+    """
+    Result of a vector store query, shaped like a Pinecone QueryResponse
+    """
+    matches: List[VectorMatch] = field(default_factory=list)
+    namespace: str = "default"
@@ -0,0 +1,52 @@
+import time
+from typing import AsyncIterator, Awaitable, Callable, List
+from app.logger import logging
+
+
+class AnswerStream:
+    """
+    Relays a generated token stream to the client while collecting the answer.
+
+    The answer only counts as complete once the token source ran to the end.
+    A provider error ends the stream with an apology. If the client
+    disconnects, Starlette cancels the response, and CancelledError is not an
+    Exception. In both cases the collected tokens are discarded and
+    `finalize` never hands them on, so a cut-off answer is never saved or
+    cached.
+    """
+    INTERRUPTED = "\n\nSorry, the answer was interrupted. Please try again."
+
+    def __init__(self, tokens: AsyncIterator[str], started_at: float = None):
+        self.tokens = tokens
+        self.started_at = started_at or time.time()
+        self.parts: List[str] = []
+        self.completed = False
+
+    async def stream(self) -> AsyncIterator[str]:
+        first_token = True
+        try:
+            async for token in self.tokens:
+                if first_token:
+                    logging.info(f"⚡ First token after {time.time() - self.started_at:.2f}s")
+                    first_token = False
+                self.parts.append(token)
+                yield token
+            self.completed = True
+        except Exception as e:
+            logging.error(f"LLM stream failed: {e}")
+            yield self.INTERRUPTED
+        finally:
+            if not self.completed:
+                self.parts.clear()
+                # Release the source now (e.g. leave a shared flight) rather than at garbage collection
+                if hasattr(self.tokens, "aclose"):
+                    await self.tokens.aclose()
+        logging.info(f"🎉 REQUEST COMPLETE - Total time: {time.time() - self.started_at:.2f}s")
+
+    async def finalize(self, persist: Callable[[str], Awaitable[None]]) -> bool:
+        """Hands the full answer to `persist` only if the stream completed; returns whether it did"""
+        if not self.completed:
+            logging.warning("⚠️  Answer stream did not complete (client left or LLM failed), not saving or caching it")
+            return False
+        await persist("".join(self.parts))
+        return True
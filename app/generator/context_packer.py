@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple
+from app.core.config import settings
+from app.core.tokenizer import count_tokens, split_sentences
+from app.logger import logging
+
+
+@dataclass
+class PackedPrompt:
+    contexts: List[str]
+    history: List[dict]
+    stats: dict = field(default_factory=dict)
+
+
+class ContextPacker:
+    """
+    Fits retrieved contexts and chat history into a token budget.
+
+    PROMPT_TOKEN_BUDGET covers prompt + answer: LLM_MAX_ANSWER_TOKENS is kept
+    for the answer, the fixed template and question are counted next, history
+    gets up to PROMPT_HISTORY_MAX_TOKENS and the rest goes to contexts.
+    Contexts are taken greedily in rerank order; a chunk that no longer fits
+    whole contributes its leading sentences, so nothing is cut mid-sentence.
+    """
+    SEPARATOR = "\n\n"
+
+    def __init__(self, token_budget: int = None, answer_tokens: int = None, history_tokens: int = None):
+        self.token_budget = token_budget or settings.PROMPT_TOKEN_BUDGET
+        self.answer_tokens = answer_tokens or settings.LLM_MAX_ANSWER_TOKENS
+        self.history_tokens = history_tokens or settings.PROMPT_HISTORY_MAX_TOKENS
+        self.separator_tokens = count_tokens(self.SEPARATOR)
+
+    def pack_history(self, history: List[dict], budget: int) -> Tuple[List[dict], int]:
+        """Summary (leading system message) first, then the most recent messages that still fit"""
+        messages = list(history)
+        summary = [messages.pop(0)] if messages and messages[0].get("role") == "system" else []
+        used = sum(self._message_tokens(msg) for msg in summary)
+        if used > budget:
+            summary, used = [], 0
+        recent = []
+        for msg in reversed(messages):
+            tokens = self._message_tokens(msg)
+            if used + tokens > budget:
+                break
+            recent.append(msg)
+            used += tokens
+        return summary + recent[::-1], used
+
+    @staticmethod
+    def _message_tokens(msg: dict) -> int:
+        return count_tokens(f"{msg['role']}: {msg['content']}\n")
+
+    def pack_contexts(self, contexts: List[str], budget: int) -> Tuple[List[str], dict]:
+        packed, used, whole, partial = [], 0, 0, 0
+        for context in contexts:
+            cost = count_tokens(context) + (self.separator_tokens if packed else 0)
+            if used + cost <= budget:
+                packed.append(context)
+                used += cost
+                whole += 1
+                continue
+            # Leading sentences of the chunk that still fit
+            sentences, room = [], budget - used - (self.separator_tokens if packed else 0)
+            for sentence in split_sentences(context):
+                tokens = count_tokens(sentence + " ")
+                if tokens > room:
+                    break
+                sentences.append(sentence)
+                room -= tokens
+            if sentences:
+                text = " ".join(sentences)
+                packed.append(text)
+                used += count_tokens(text) + (self.separator_tokens if len(packed) > 1 else 0)
+                partial += 1
+        stats = {"contexts_in": len(contexts), "contexts_whole": whole, "contexts_partial": partial, "context_tokens": used}
+        return packed, stats
+
+    def pack(self, template_tokens: int, contexts: List[str], history: List[dict]) -> PackedPrompt:
+        """template_tokens: tokens of the prompt without contexts and history (instructions + question)"""
+        available = self.token_budget - self.answer_tokens - template_tokens
+        history, history_used = self.pack_history(history or [], max(0, min(self.history_tokens, available)))
+        contexts, stats = self.pack_contexts(contexts or [], max(0, available - history_used))
+        stats.update({
+            "history_messages": len(history),
+            "history_tokens": history_used,
+            "prompt_tokens": template_tokens + history_used + stats["context_tokens"],
+            "budget": self.token_budget - self.answer_tokens,
+        })
+        logging.info(f"Packed prompt: {stats}")
+        return PackedPrompt(contexts, history, stats)
@@ -3,13 +3,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-import requests
+import json
+import asyncio
+import httpx
+from app.core.config import settings
+from app.core.tokenizer import count_tokens
+from app.generator.context_packer import ContextPacker
 from app.tracking.mlflow_manager import MLflowManager
-import time
-from euriai import EuriaiClient
 
 
 class GPTClient:
+    """
+    Async chat-completions client. Every call goes through one pooled
+    httpx.AsyncClient, waits with asyncio.sleep between retries and has its own
+    timeout, so a slow provider only holds the request that is waiting on it.
+    Cancelling the awaiting task (e.g. the client disconnected) aborts the
+    HTTP call. Use get_gpt_client() to share one instance across the app.
+    """
+
     def __init__(self):
         try:
             self.url = os.getenv("EURI_CHAT_URI")
@@ -18,43 +29,58 @@ class GPTClient:
             if not self.url or not self.api_key:
                 raise ValueError("EURI_CHAT_URI or OPENAI_API_KEY is missing in .env")
 
-            self.client = EuriaiClient(
-                api_key=self.api_key,
-                model='gpt-4.1-nano'
-            )
-            
-            # Configure session for connection pooling
-            self.session = requests.Session()
-            adapter = requests.adapters.HTTPAdapter(
-                pool_connections=10,
-                pool_maxsize=20,
-                max_retries=3  # Add retries at adapter level
-            )
-            self.session.mount("https://", adapter)
-            self.session.mount("http://", adapter)
+            self.model = settings.LLM_MODEL
+            self.timeout = settings.LLM_TIMEOUT_SECONDS
+            self.max_answer_tokens = settings.LLM_MAX_ANSWER_TOKENS
+            self.packer = ContextPacker()
+            self._async_client = None
 
             logging.info("GPTClient initialized successfully")
 
         except Exception as e:
             logging.error(f"Error in GPTClient init: {e}")
 
-    def generate_text(self, query: str, contexts: list, history: list, retries: int = 3) -> str:
-        """Generate text with improved retry logic"""
-        
-        logging.info("Generating text in generate_text function of GPTClient class")
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # Created on first use so the pool binds to the running event loop
+        if self._async_client is None or self._async_client.is_closed:
+            limits = httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            )
+            self._async_client = httpx.AsyncClient(
+                headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(self.timeout, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS),
+                limits=limits,
+            )
+        return self._async_client
 
-        if not contexts or len(contexts) == 0:
-            logging.warning("No contexts available to generate answer.")
-            return "No contexts available to generate answer."
-        
-        # Build history prompt
-        history_prompt = ""
-        for msg in history:
-            history_prompt += f"{msg['role']}: {msg['content']}\n"
-        
-        # Join contexts - limit context size
-        context = "\n\n".join(contexts[:5])  # Use only top 5 contexts
-        
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    async def _complete(self, prompt: str, temperature: float, max_tokens: int, timeout: float = None) -> str:
+        """One non-streaming chat completion; raises on HTTP errors"""
+        response = await self.async_client.post(
+            self.url,
+            json={
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+            timeout=httpx.Timeout(timeout or self.timeout, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS),
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    def build_prompt(self, query: str, contexts: list, history: list) -> str:
+        """
+        Generation prompt shared by the blocking and the streaming path.
+        Contexts (best rerank score first) and history are packed into the
+        token budget by ContextPacker instead of being cut at a character count.
+        """
         # Detect formatting requirements
         query_lower = query.lower()
         formatting_instructions = ""
@@ -78,46 +104,55 @@ Rules:
 - Follow requested format (bullet/table/paragraph)
 - For tables: Use | separators, SHORT column names"""
 
-        prompt = f"""{system_instructions}
+        def render(history_prompt: str, context: str) -> str:
+            return f"""{system_instructions}
 
 {formatting_instructions}
 
-History: {history_prompt[:500]}
+History: {history_prompt}
 
-Context: {context[:2000]}
+Context: {context}
 
 Q: {query}
 
 Answer:"""
 
+        packed = self.packer.pack(count_tokens(render("", "")), contexts, history)
+        history_prompt = "".join(f"{msg['role']}: {msg['content']}\n" for msg in packed.history)
+        return render(history_prompt, ContextPacker.SEPARATOR.join(packed.contexts))
+
+    async def generate_text(self, query: str, contexts: list, history: list, retries: int = 3) -> str:
+        """Generate text with improved retry logic"""
+        
+        logging.info("Generating text in generate_text function of GPTClient class")
+
+        if not contexts or len(contexts) == 0:
+            logging.warning("No contexts available to generate answer.")
+            return "No contexts available to generate answer."
+
+        prompt = self.build_prompt(query, contexts, history)
+
         # Retry loop with exponential backoff
         for attempt in range(1, retries + 1):
             try:
                 logging.info(f"LLM request attempt {attempt}")
 
-                response = self.client.generate_completion(
-                    prompt=prompt,
-                    temperature=0.2,
-                    max_tokens=600,
-                )
-
-                answer = response["choices"][0]["message"]["content"]
+                answer = await self._complete(prompt, temperature=0.2, max_tokens=self.max_answer_tokens)
                 logging.info(f"✅ LLM generated {len(answer)} characters")
                 return answer
 
-            except requests.exceptions.Timeout as e:
+            except httpx.TimeoutException as e:
                 wait_time = 2 ** attempt  # 2s, 4s, 8s
                 logging.warning(f"⏱️  LLM timeout (attempt {attempt}/{retries})")
                 if attempt < retries:
                     logging.info(f"⏳ Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
+                    await asyncio.sleep(wait_time)
                 else:
                     logging.error("❌ Request timed out after all retries")
                     return "Sorry, the response is taking too long. Please try again with a shorter question."
 
-            except (requests.exceptions.ConnectionError, 
+            except (httpx.TransportError,
                     ConnectionResetError,
-                    requests.exceptions.ChunkedEncodingError,
                     BrokenPipeError,
                     OSError) as e:
                 wait_time = 2 ** attempt  # Exponential backoff
@@ -126,13 +161,13 @@ Answer:"""
                 
                 if attempt < retries:
                     logging.info(f"⏳ Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
+                    await asyncio.sleep(wait_time)
                 else:
                     logging.error("❌ Connection failed after all retries")
                     return "Sorry, I'm having trouble connecting to the AI service. Please try again in a moment."
 
-            except requests.exceptions.HTTPError as e:
-                status_code = e.response.status_code if hasattr(e, 'response') else None
+            except httpx.HTTPStatusError as e:
+                status_code = e.response.status_code
                 
                 # Handle rate limiting specially
                 if status_code == 429:
@@ -140,28 +175,28 @@ Answer:"""
                     logging.warning(f"🚦 Rate limit hit (attempt {attempt}/{retries})")
                     if attempt < retries:
                         logging.info(f"⏳ Waiting {wait_time}s for rate limit...")
-                        time.sleep(wait_time)
+                        await asyncio.sleep(wait_time)
                     else:
                         return "Sorry, too many requests. Please wait a moment and try again."
                 else:
                     logging.error(f"❌ LLM HTTP error {status_code}: {e}")
                     if attempt < retries:
-                        time.sleep(2 ** attempt)
+                        await asyncio.sleep(2 ** attempt)
                     else:
                         return "Sorry, AI service error. Please try again later."
 
-            except KeyError as e:
+            except (KeyError, IndexError) as e:
                 # Handle malformed API response
                 logging.error(f"❌ Malformed API response: {e}")
                 if attempt < retries:
-                    time.sleep(2 ** attempt)
+                    await asyncio.sleep(2 ** attempt)
                 else:
                     return "Sorry, received invalid response from AI service."
 
             except Exception as e:
                 logging.error(f"❌ LLM unexpected error (attempt {attempt}/{retries}): {type(e).__name__}: {str(e)[:200]}")
                 if attempt < retries:
-                    time.sleep(2 ** attempt)
+                    await asyncio.sleep(2 ** attempt)
                 else:
                     return "Sorry, an unexpected error occurred. Please try again."
 
@@ -169,26 +204,82 @@ Answer:"""
         logging.error("LLM generation failed after all retries")
         return "Sorry, I'm having trouble right now. Please try again in a few moments."
 
-    def summarize(self, prompt: str, retries: int = 3) -> str:
+    async def stream_text(self, query: str, contexts: list, history: list, retries: int = 3):
+        """
+        Streams the answer as the provider produces it (OpenAI-style SSE deltas).
+        Failures before the first token are retried and end in the same "Sorry..."
+        messages as generate_text; once tokens went out the error is raised,
+        since the partial answer cannot be taken back.
+        """
+        logging.info("Streaming text in stream_text function of GPTClient class")
+
+        if not contexts or len(contexts) == 0:
+            logging.warning("No contexts available to generate answer.")
+            yield "No contexts available to generate answer."
+            return
+
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": self.build_prompt(query, contexts, history)}],
+            "temperature": 0.2,
+            "max_tokens": self.max_answer_tokens,
+            "stream": True,
+        }
+
+        for attempt in range(1, retries + 1):
+            started = False
+            try:
+                logging.info(f"LLM stream attempt {attempt}")
+                async with self.async_client.stream("POST", self.url, json=payload) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        choices = json.loads(data).get("choices") or [{}]
+                        token = (choices[0].get("delta") or {}).get("content")
+                        if token:
+                            started = True
+                            yield token
+                logging.info("✅ LLM stream completed")
+                return
+
+            except Exception as e:
+                if started:
+                    logging.error(f"❌ LLM stream broke mid-answer: {type(e).__name__}: {str(e)[:200]}")
+                    raise
+                status_code = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                logging.warning(f"🔌 LLM stream error (attempt {attempt}/{retries}): {type(e).__name__}: {str(e)[:100]}")
+                if attempt < retries:
+                    wait_time = 5 * attempt if status_code == 429 else 2 ** attempt
+                    logging.info(f"⏳ Retrying in {wait_time}s...")
+                    await asyncio.sleep(wait_time)
+                elif isinstance(e, httpx.TimeoutException):
+                    yield "Sorry, the response is taking too long. Please try again with a shorter question."
+                elif status_code == 429:
+                    yield "Sorry, too many requests. Please wait a moment and try again."
+                elif isinstance(e, (httpx.TransportError, OSError)):
+                    yield "Sorry, I'm having trouble connecting to the AI service. Please try again in a moment."
+                else:
+                    yield "Sorry, AI service error. Please try again later."
+
+    async def summarize(self, prompt: str, retries: int = 3) -> str:
         """Summarize conversation history with retry logic"""
         
         for attempt in range(1, retries + 1):
             try:
                 logging.info(f"Summarization attempt {attempt}/{retries}")
                 
-                response = self.client.generate_completion(
-                    prompt=prompt,
-                    temperature=0.2,
-                    max_tokens=300
-                )
-                
-                summary = response["choices"][0]["message"]["content"]
+                summary = await self._complete(prompt, temperature=0.2, max_tokens=300, timeout=30)
                 logging.info(f"✅ Summary generated ({len(summary)} chars)")
                 return summary
                 
-            except (requests.exceptions.ConnectionError, 
+            except (httpx.TransportError,
                     ConnectionResetError,
-                    requests.exceptions.ChunkedEncodingError,
                     BrokenPipeError,
                     OSError) as e:
                 wait_time = 2 ** attempt  # 2s, 4s, 8s
@@ -197,7 +288,7 @@ Answer:"""
                 
                 if attempt < retries:
                     logging.info(f"⏳ Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
+                    await asyncio.sleep(wait_time)
                 else:
                     logging.error("❌ Summarization failed after all retries")
                     return "Unable to generate summary due to connection issues."
@@ -205,13 +296,13 @@ Answer:"""
             except Exception as e:
                 logging.error(f"❌ Summarization error (attempt {attempt}/{retries}): {type(e).__name__}: {str(e)[:200]}")
                 if attempt < retries:
-                    time.sleep(2 ** attempt)
+                    await asyncio.sleep(2 ** attempt)
                 else:
                     return "Unable to generate summary."
         
         return "Unable to generate summary."
         
-    def generate_title(self, question: str, retries: int = 3) -> str:
+    async def generate_title(self, question: str, retries: int = 3) -> str:
         """Generate a concise title for the chat session with retry logic"""
         
         prompt = f"""Generate a short, descriptive title (3-6 words) for a chat that starts with this question:
@@ -230,13 +321,7 @@ Answer:"""
             try:
                 logging.info(f"Title generation attempt {attempt}/{retries}")
                 
-                response = self.client.generate_completion(
-                    prompt=prompt,
-                    temperature=0.3,
-                    max_tokens=20
-                )
-                
-                title = response["choices"][0]["message"]["content"].strip()
+                title = (await self._complete(prompt, temperature=0.3, max_tokens=20, timeout=10)).strip()
                 
                 # Validation: fallback if AI gives weird response
                 if len(title) > 60 or len(title) < 3 or '\n' in title:
@@ -245,9 +330,8 @@ Answer:"""
                 logging.info(f"✅ Title generated: {title}")
                 return title
             
-            except (requests.exceptions.ConnectionError, 
+            except (httpx.TransportError,
                     ConnectionResetError,
-                    requests.exceptions.ChunkedEncodingError,
                     BrokenPipeError,
                     OSError) as e:
                 wait_time = 2 ** attempt
@@ -256,7 +340,7 @@ Answer:"""
                 
                 if attempt < retries:
                     logging.info(f"⏳ Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
+                    await asyncio.sleep(wait_time)
                 else:
                     logging.error("❌ Title generation failed after all retries, using fallback")
                     return self._extract_simple_title(question)
@@ -286,4 +370,15 @@ Answer:"""
         if len(title) < 10:
             title = question[:50]
         
-        return title
\ No newline at end of file
+        return title
+
+
+_shared_client = None
+
+
+def get_gpt_client() -> GPTClient:
+    """The process-wide GPTClient, so every caller shares one connection pool"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = GPTClient()
+    return _shared_client
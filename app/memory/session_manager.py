@@ -7,14 +7,14 @@ from uuid import UUID
 from app.db.database import AsyncSessionLocal
 from app.memory.chat_memory import save_summary,get_summary
 from app.memory.summarizer import update_summary
-from app.generator.gpt_client import GPTClient
+from app.generator.gpt_client import get_gpt_client
 from app.logger import logging
 
 async def update_and_save_summary(session_id, existing_summary, messages):
     async with AsyncSessionLocal() as db:
         try:
-            # Create fresh LLM instance for this task
-            llm = GPTClient()  # ✅ GOOD: Fresh instance
+            # Shared async client: no new connection pool per summary
+            llm = get_gpt_client()
             
             new_summary = await update_summary(
                 llm=llm,
@@ -28,7 +28,7 @@ async def update_summary(llm, existing_summary: str, messages: List[dict]) -> st
     - Preferences
     """
 
-    summary = llm.summarize(prompt)
+    summary = await llm.summarize(prompt)
     return summary
 
 
@@ -1,50 +1,361 @@
-from rank_bm25 import BM25Okapi
-from typing import List
-import pickle
+from typing import Dict, List
+import json
+import os
+import threading
+import numpy as np
+from app.core.config import settings
 from app.logger import logging
 from app.dataclasses import Chunk
+from app.retrieval.bm25_engine import SparseBM25, merge_indexes
+from app.retrieval.bm25_format import open_index, write_index
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class BM25Segment:
+    """One immutable on-disk segment plus the tombstones recorded against it"""
+
+    def __init__(self, name: str, engine: SparseBM25, chunk_ids, deleted: Dict[str, int] = None, terms: np.ndarray = None):
+        self.name = name
+        self.engine = engine
+        self.chunk_ids = chunk_ids
+        self.deleted = dict(deleted or {})
+        self._terms = terms
+        self.live = np.ones(engine.corpus_size, dtype=bool)
+        if self.deleted:
+            self.live[list(self.deleted.values())] = False
+
+    @property
+    def num_docs(self) -> int:
+        return self.engine.corpus_size
+
+    @property
+    def num_live(self) -> int:
+        return self.num_docs - len(self.deleted)
+
+    @property
+    def terms(self) -> np.ndarray:
+        """Vocabulary as a bytes array in term id order; decoded once per segment"""
+        if self._terms is None:
+            vocab = self.engine.vocab
+            if hasattr(vocab, "as_array"):
+                self._terms = vocab.as_array()
+            else:
+                self._terms = np.array([term.encode("utf-8") for term in sorted(vocab, key=vocab.__getitem__)], dtype=bytes)
+        return self._terms
+
+    @property
+    def doc_freqs(self) -> np.ndarray:
+        return np.diff(self.engine.indptr)
+
+    def with_deletions(self, deleted: Dict[str, int]) -> "BM25Segment":
+        return BM25Segment(self.name, self.engine, self.chunk_ids, {**self.deleted, **deleted}, self._terms)
+
 
 class BM25Manager:
-    def __init__(self,):
-        self.corpus=[]
-        self.chunk_ids=[]
-        self.bm25=None
-    
-    def build_index(self,chunks:List[Chunk]):
+    """
+    Lucene-style segmented BM25 index.
+
+    New chunks go into small immutable segments, deletions are tombstones keyed
+    by Chunk.id, and merges compact segments (dropping tombstoned docs) in a
+    background thread. A manifest.json in the index directory lists the live
+    segments and is swapped atomically on every commit. Searches work on a
+    snapshot of the segment list, so they never block on writers.
+    """
+
+    def __init__(self, index_path: str = None, max_segments: int = None):
+        self.index_path = index_path or settings.BM25_INDEX_PATH
+        self.max_segments = max_segments or settings.BM25_MAX_SEGMENTS
+        self.corpus = []
+        self.chunk_ids = []
+        self.bm25 = None
+        self.segments: List[BM25Segment] = []
+        self.generation = 0
+        self.next_segment = 1
+        self._id_index = None
+        self._stats = None
+        self._write_lock = threading.Lock()
+        # Held for a whole merge so the background thread and explicit callers never merge concurrently
+        self._merge_lock = threading.Lock()
+        self._merge_thread = None
+
+    def build_index(self, chunks: List[Chunk]):
         try:
             logging.info("building index for the BM25 from thte chunks")
             for chunk in chunks:
-                tokens=chunk.text.split()
+                tokens = chunk.text.split()
                 self.corpus.append(tokens)
                 self.chunk_ids.append(chunk.id)
-            self.bm25=BM25Okapi(self.corpus)
+            self.bm25 = SparseBM25().build(self.corpus)
             logging.info("BM25 index built successfully")
         except Exception as e:
             logging.info(f"Error in building index of BM25 {e}")
-    
-    def save(self, file_path: str = "bm25_index.pkl"):
-        with open(file_path, "wb") as f:
-            pickle.dump((self.bm25, self.chunk_ids), f)
 
-    def load(self, file_path: str = "bm25_index.pkl"):
-        with open(file_path, "rb") as f:
-            self.bm25, self.chunk_ids = pickle.load(f)
+    def save(self, index_path: str = None):
+        """Writes the index built by build_index as a single fresh segment, replacing existing segments"""
+        self.index_path = index_path or self.index_path
+        with self._write_lock:
+            old_names = {segment.name for segment in self.segments}
+            existing = self._read_manifest()
+            if existing:
+                # Continue the on-disk numbering so readers see a newer generation
+                self.generation = max(self.generation, existing["generation"])
+                self.next_segment = max(self.next_segment, existing["next_segment"])
+                old_names |= {entry["name"] for entry in existing["segments"]}
+            segment = self._write_segment(self.bm25, self.chunk_ids)
+            self._commit([segment])
+            self._remove_segment_files(old_names)
+
+    def _read_manifest(self):
+        path = os.path.join(self.index_path, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def load(self, index_path: str = None):
+        self.index_path = index_path or self.index_path
+        manifest = self._read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"No BM25 manifest found in {self.index_path}")
+        if manifest.get("format_version") != MANIFEST_VERSION:
+            raise ValueError(
+                f"{self.index_path} has BM25 manifest version {manifest.get('format_version')}, "
+                f"expected {MANIFEST_VERSION}; rebuild the index"
+            )
+        segments = []
+        for entry in manifest["segments"]:
+            engine, chunk_ids = open_index(os.path.join(self.index_path, entry["name"]))
+            segments.append(BM25Segment(entry["name"], engine, chunk_ids, entry.get("deleted")))
+        self.generation = manifest["generation"]
+        self.next_segment = manifest["next_segment"]
+        self._set_segments(segments)
+        logging.info(f"Loaded BM25 index generation {self.generation} with {len(segments)} segment(s)")
+
+    def refresh(self):
+        """Reloads the manifest if another process committed a newer generation"""
+        try:
+            with open(os.path.join(self.index_path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                generation = json.load(f)["generation"]
+            if generation != self.generation:
+                self.load()
+        except Exception as e:
+            logging.error(f"Error refreshing BM25 index {e}")
+
+    # ---------------- incremental updates ----------------
+
+    def add_chunks(self, chunks: List[Chunk]):
+        """Indexes only the given chunks into a new segment; chunks already live are skipped"""
+        with self._write_lock:
+            live_ids = self._live_id_index()
+            new_chunks = {chunk.id: chunk for chunk in chunks if chunk.id not in live_ids}
+            if not new_chunks:
+                logging.info("BM25 add_chunks: nothing new to index")
+                return
+            corpus = [chunk.text.split() for chunk in new_chunks.values()]
+            segment = self._write_segment(SparseBM25().build(corpus), list(new_chunks))
+            self._commit(self.segments + [segment])
+            logging.info(f"BM25 add_chunks: indexed {len(new_chunks)} chunk(s) into {segment.name}")
+        self.maybe_merge_in_background()
+
+    def delete_chunks(self, chunk_ids: List[str]):
+        """Tombstones chunks by Chunk.id; they stop matching immediately and are purged on merge"""
+        with self._write_lock:
+            live_ids = self._live_id_index()
+            by_segment: Dict[str, Dict[str, int]] = {}
+            for chunk_id in chunk_ids:
+                if chunk_id in live_ids:
+                    name, doc = live_ids[chunk_id]
+                    by_segment.setdefault(name, {})[chunk_id] = doc
+            if not by_segment:
+                return
+            self._commit([
+                segment.with_deletions(by_segment[segment.name]) if segment.name in by_segment else segment
+                for segment in self.segments
+            ])
+            logging.info(f"BM25 delete_chunks: tombstoned {sum(map(len, by_segment.values()))} chunk(s)")
+        self.maybe_merge_in_background()
+
+    def sync(self, chunks: List[Chunk]):
+        """Makes the index match `chunks`: indexes new ones and tombstones those no longer present"""
+        wanted = {chunk.id for chunk in chunks}
+        stale = [chunk_id for chunk_id in self._live_id_index() if chunk_id not in wanted]
+        self.delete_chunks(stale)
+        self.add_chunks(chunks)
+
+    def maybe_merge_in_background(self):
+        deleted = sum(len(segment.deleted) for segment in self.segments)
+        total = sum(segment.num_docs for segment in self.segments) or 1
+        if len(self.segments) <= self.max_segments and deleted / total < 0.2:
+            return
+        if self._merge_lock.locked() or (self._merge_thread and self._merge_thread.is_alive()):
+            return
+        self._merge_thread = threading.Thread(target=self.merge_segments, daemon=True)
+        self._merge_thread.start()
+
+    def merge_segments(self, force: bool = False):
+        """
+        Compacts segments. By default merges the smallest segments until at most
+        max_segments remain (plus any with tombstones); force merges everything.
+        A call made while another merge runs waits for it, then re-plans on the
+        resulting segments.
+        """
+        try:
+            with self._merge_lock, self._write_lock:
+                segments = self.segments
+                if force:
+                    to_merge = list(segments)
+                else:
+                    by_size = sorted(segments, key=lambda segment: segment.num_docs)
+                    excess = max(len(segments) - self.max_segments + 1, 0)
+                    picked = {segment.name for segment in by_size[:excess]}
+                    picked |= {segment.name for segment in segments if segment.deleted}
+                    to_merge = [segment for segment in segments if segment.name in picked]
+                if len(to_merge) < 2 and not any(segment.deleted for segment in to_merge):
+                    return
+                logging.info(f"Merging {len(to_merge)} BM25 segment(s)")
+                engine, chunk_ids = merge_indexes([
+                    (segment.engine, segment.chunk_ids, segment.live) for segment in to_merge
+                ])
+                merged = self._write_segment(engine, chunk_ids)
+                merged_names = {segment.name for segment in to_merge}
+                # Keep the merged segment where the first merged one was, so doc order stays stable
+                remaining, inserted = [], False
+                for segment in segments:
+                    if segment.name not in merged_names:
+                        remaining.append(segment)
+                    elif not inserted:
+                        remaining.append(merged)
+                        inserted = True
+                self._commit(remaining)
+                self._remove_segment_files(merged_names)
+                logging.info(f"BM25 merge complete, {len(remaining)} segment(s) live")
+        except Exception as e:
+            logging.error(f"Error merging BM25 segments {e}")
+
+    # ---------------- search ----------------
 
     def search(self, query: str, top_k: int = 5):
         try:
             logging.info("searching with the scores with default K=5 ")
             tokens = query.split()
-            scores = self.bm25.get_scores(tokens)
+            segments = self.segments
+            if not segments:
+                return []
+            stats = self._global_stats(segments)
+            query_idfs = {token: stats["idf"](token) for token in set(tokens)} if len(segments) > 1 else {}
 
-            ranked = sorted(
-                zip(self.chunk_ids, scores),
-                key=lambda x: x[1],
-                reverse=True
-            )
-            return ranked[:top_k]
+            candidates = []
+            for segment in segments:
+                vocab = segment.engine.vocab
+                matched = [token for token in tokens if token in vocab]
+                if not matched:
+                    continue
+                term_ids = [vocab[token] for token in matched]
+                if len(segments) == 1:
+                    # Single segment: its own stats are the corpus stats
+                    docs, scores = segment.engine.postings_scores(term_ids)
+                else:
+                    term_idfs = [query_idfs[token] for token in matched]
+                    docs, scores = segment.engine.postings_scores(term_ids, term_idfs, stats["avgdl"])
+                if segment.deleted:
+                    live = segment.live[docs]
+                    docs, scores = docs[live], scores[live]
+                # Only documents sharing a term with the query are scored
+                docs, scores = SparseBM25.top_k(docs, scores, top_k)
+                candidates.extend((segment.chunk_ids[doc], float(score)) for doc, score in zip(docs, scores))
+
+            candidates.sort(key=lambda x: x[1], reverse=True)
+            return candidates[:top_k]
         except Exception as e:
             logging.error(f"Error in search function {e}")
-    
 
+    # ---------------- internals ----------------
+
+    def _write_segment(self, engine: SparseBM25, chunk_ids: List[str]) -> BM25Segment:
+        name = f"seg_{self.next_segment:06d}.bin"
+        self.next_segment += 1
+        os.makedirs(self.index_path, exist_ok=True)
+        path = os.path.join(self.index_path, name)
+        write_index(path, engine, chunk_ids)
+        engine, chunk_ids = open_index(path)
+        return BM25Segment(name, engine, chunk_ids)
+
+    def _commit(self, segments: List[BM25Segment]):
+        manifest = {
+            "format_version": MANIFEST_VERSION,
+            "generation": self.generation + 1,
+            "next_segment": self.next_segment,
+            "segments": [
+                {"name": segment.name, "num_docs": segment.num_docs, "deleted": segment.deleted}
+                for segment in segments
+            ],
+        }
+        path = os.path.join(self.index_path, MANIFEST_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+        self.generation += 1
+        self._set_segments(segments)
+
+    def _set_segments(self, segments: List[BM25Segment]):
+        # Single reference swap: in-flight searches keep the snapshot they started with
+        self.segments = segments
+        self._id_index = None
+        self._stats = None
+
+    def _remove_segment_files(self, names):
+        live_names = {segment.name for segment in self.segments}
+        for name in names:
+            if name in live_names:
+                continue
+            try:
+                # Open mmaps (ours or other workers') stay valid after unlink
+                os.remove(os.path.join(self.index_path, name))
+            except OSError as e:
+                logging.error(f"Could not remove BM25 segment {name}: {e}")
+
+    def _live_id_index(self) -> Dict[str, tuple]:
+        if self._id_index is None:
+            index = {}
+            for segment in self.segments:
+                for doc, chunk_id in enumerate(segment.chunk_ids):
+                    if segment.live[doc]:
+                        index[chunk_id] = (segment.name, doc)
+            self._id_index = index
+        return self._id_index
+
+    def _global_stats(self, segments: List[BM25Segment]) -> dict:
+        """
+        Corpus-wide N, avgdl and idf over all segments. Like Lucene, tombstoned
+        docs still count until they are merged away. Computed once per commit,
+        vectorised over the segments' cached term arrays.
+        """
+        stats = self._stats
+        if stats is not None and stats["segments"] is segments:
+            return stats
+        num_docs = sum(segment.num_docs for segment in segments)
+        total_len = sum(float(segment.engine.doc_len.sum()) for segment in segments)
+        avgdl = total_len / num_docs if num_docs else 0.0
+        idf_floor = 0.0
+        epsilon = segments[0].engine.epsilon if segments else 0.25
+        terms, doc_freqs = np.zeros(0, dtype="S1"), np.zeros(0, dtype=np.float64)
+        if len(segments) > 1:
+            # Merged vocabulary: sort-unique the segments' term arrays and sum their doc freqs
+            terms, inverse = np.unique(np.concatenate([segment.terms for segment in segments]), return_inverse=True)
+            weights = np.concatenate([segment.doc_freqs for segment in segments]).astype(np.float64)
+            doc_freqs = np.bincount(inverse.ravel(), weights=weights, minlength=len(terms))
+            raw_idf = np.log(num_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+            idf_floor = epsilon * float(raw_idf.mean()) if len(raw_idf) else 0.0
+
+        def idf(term: str) -> float:
+            key = term.encode("utf-8")
+            pos = int(np.searchsorted(terms, key))
+            df = doc_freqs[pos] if pos < len(terms) and terms[pos] == key else 0.0
+            value = np.log(num_docs - df + 0.5) - np.log(df + 0.5)
+            return float(value) if value >= 0 else idf_floor
 
-    
\ No newline at end of file
+        stats = {"segments": segments, "avgdl": avgdl, "idf": idf}
+        self._stats = stats
+        return stats
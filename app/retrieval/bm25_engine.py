@@ -0,0 +1,163 @@
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Tuple
+
+
+class SparseBM25:
+    """
+    BM25 Okapi scorer over term-major CSR postings.
+
+    For term id t, postings live in doc_ids[indptr[t]:indptr[t+1]] with the
+    matching term frequencies in tfs. A query only touches the postings of its
+    own terms, so latency grows with the document frequency of the query terms
+    instead of corpus size. Scores match rank_bm25.BM25Okapi (same k1, b and
+    epsilon floor for negative idf).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: Dict[str, int] = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.avgdl = 0.0
+
+    @property
+    def corpus_size(self) -> int:
+        return int(self.doc_len.shape[0])
+
+    def build(self, corpus: List[List[str]]):
+        counts = [Counter(tokens) for tokens in corpus]
+        # Term ids follow sorted term order so the on-disk vocabulary can be binary searched
+        vocab = {term: term_id for term_id, term in enumerate(sorted(set().union(*counts)))}
+        term_ids, docs, freqs = [], [], []
+        for doc_index, doc_counts in enumerate(counts):
+            for term, freq in doc_counts.items():
+                term_ids.append(vocab[term])
+                docs.append(doc_index)
+                freqs.append(freq)
+        doc_len = [len(tokens) for tokens in corpus]
+        return self.from_postings(vocab, term_ids, docs, freqs, doc_len)
+
+    def from_postings(self, vocab: Dict[str, int], term_ids, doc_ids, tfs, doc_len):
+        """
+        Fills the index from flat (term id, doc id, tf) postings. Postings of a
+        term must already be in doc order relative to each other.
+        """
+        self.vocab = vocab
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        # Stable sort keeps each posting list ordered by doc id
+        order = np.argsort(term_ids, kind="stable")
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        self.tfs = np.asarray(tfs, dtype=np.float32)[order]
+        self.indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=self.indptr[1:])
+
+        self.doc_len = np.asarray(doc_len, dtype=np.float32)
+        self.avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+        self.idf = self.compute_idf(np.diff(self.indptr), self.corpus_size, self.epsilon)
+        return self
+
+    def doc_freq(self, term_id: int) -> int:
+        return int(self.indptr[term_id + 1] - self.indptr[term_id])
+
+    @staticmethod
+    def compute_idf(doc_freqs: np.ndarray, corpus_size: int, epsilon: float) -> np.ndarray:
+        """Okapi idf with negative values floored at epsilon * average idf (rank_bm25 behaviour)"""
+        if not len(doc_freqs):
+            return np.zeros(0, dtype=np.float32)
+        doc_freqs = doc_freqs.astype(np.float64)
+        idf = np.log(corpus_size - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        idf[idf < 0] = epsilon * idf.mean()
+        return idf.astype(np.float32)
+
+    def term_ids(self, tokens: List[str]) -> List[int]:
+        # Repeated query tokens count once per occurrence, like BM25Okapi.get_scores
+        return [self.vocab[token] for token in tokens if token in self.vocab]
+
+    def postings_scores(self, term_ids: List[int], term_idfs: List[float] = None, avgdl: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (doc indices, scores) for every document containing at least
+        one query term. term_idfs/avgdl can be overridden with statistics
+        computed over several segments.
+        """
+        if term_idfs is None:
+            term_idfs = [self.idf[term_id] for term_id in term_ids]
+        avgdl = self.avgdl if avgdl is None else avgdl
+        if not term_ids or not avgdl:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+        docs, contributions = [], []
+        for term_id, idf in zip(term_ids, term_idfs):
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            posting_docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[posting_docs] / avgdl)
+            docs.append(posting_docs)
+            contributions.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        docs = np.concatenate(docs)
+        matched, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contributions))
+        return matched, scores
+
+    @staticmethod
+    def top_k(docs: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if k <= 0 or not len(docs):
+            return docs[:0], scores[:0]
+        if k < len(scores):
+            keep = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        return docs[order], scores[order]
+
+    def search(self, tokens: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        docs, scores = self.postings_scores(self.term_ids(tokens))
+        return self.top_k(docs, scores, k)
+
+    def get_scores(self, tokens: List[str]) -> np.ndarray:
+        """Dense score vector over the whole corpus, for parity checks against BM25Okapi"""
+        dense = np.zeros(self.corpus_size, dtype=np.float64)
+        docs, scores = self.postings_scores(self.term_ids(tokens))
+        dense[docs] = scores
+        return dense
+
+
+def merge_indexes(parts: List[Tuple[SparseBM25, List[str], np.ndarray]]) -> Tuple[SparseBM25, List[str]]:
+    """
+    Merges (engine, chunk_ids, live mask) parts into a single engine, dropping
+    documents whose mask entry is False. Works directly on the postings, so
+    nothing is re-tokenized.
+    """
+    terms = sorted(set().union(*(set(engine.vocab) for engine, _, _ in parts)))
+    vocab = {term: term_id for term_id, term in enumerate(terms)}
+    term_ids, doc_ids, tfs, doc_len, chunk_ids = [], [], [], [], []
+    base = 0
+    for engine, part_ids, live in parts:
+        live = np.asarray(live, dtype=bool)
+        new_doc = np.cumsum(live) - 1 + base
+        # engine.vocab iterates in term id order (sorted terms)
+        global_term = np.asarray([vocab[term] for term in engine.vocab], dtype=np.int64)
+        posting_term = np.repeat(np.arange(len(global_term)), np.diff(engine.indptr))
+        keep = live[engine.doc_ids]
+        term_ids.append(global_term[posting_term[keep]])
+        doc_ids.append(new_doc[engine.doc_ids[keep]])
+        tfs.append(engine.tfs[keep])
+        doc_len.append(engine.doc_len[live])
+        chunk_ids.extend(part_ids[doc] for doc in np.flatnonzero(live))
+        base += int(live.sum())
+
+    first = parts[0][0] if parts else SparseBM25()
+    merged = SparseBM25(k1=first.k1, b=first.b, epsilon=first.epsilon)
+    if not parts:
+        return merged, chunk_ids
+    term_ids = np.concatenate(term_ids)
+    # Drop terms whose every posting belonged to a deleted document
+    used, term_ids = np.unique(term_ids, return_inverse=True)
+    vocab = {terms[old_id]: new_id for new_id, old_id in enumerate(used)}
+    merged.from_postings(vocab, term_ids, np.concatenate(doc_ids), np.concatenate(tfs), np.concatenate(doc_len))
+    return merged, chunk_ids
@@ -0,0 +1,196 @@
+"""
+Columnar on-disk BM25 index.
+
+Layout (little-endian):
+    header   magic, format version, k1/b/epsilon/avgdl, counts
+    table    (offset, nbytes) for every section below
+    sections term_offsets, term_blob, indptr, doc_ids, tfs, doc_len, idf,
+             id_offsets, id_blob (each 8-byte aligned)
+
+The file is opened with mmap and every section is a zero-copy NumPy view, so
+startup does no parsing and all workers share the same pages through the OS
+page cache. Terms are stored in sorted order and looked up by binary search.
+"""
+
+import mmap
+import os
+import struct
+import numpy as np
+from typing import List, Sequence
+from app.retrieval.bm25_engine import SparseBM25
+
+MAGIC = b"RAGBM25\x00"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<8sI4xQQQdddd")
+_SECTIONS = (
+    ("term_offsets", np.int64),
+    ("term_blob", np.uint8),
+    ("indptr", np.int64),
+    ("doc_ids", np.int32),
+    ("tfs", np.float32),
+    ("doc_len", np.float32),
+    ("idf", np.float32),
+    ("id_offsets", np.int64),
+    ("id_blob", np.uint8),
+)
+_TABLE = struct.Struct("<" + "QQ" * len(_SECTIONS))
+
+
+class MmapStrings(Sequence):
+    """Read-only list of utf-8 strings stored as offsets + blob"""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes().decode("utf-8")
+
+
+class SortedVocab:
+    """term -> term id mapping over a sorted MmapStrings, resolved by binary search"""
+
+    def __init__(self, terms: MmapStrings):
+        self.terms = terms
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _find(self, term: str) -> int:
+        lo, hi = 0, len(self.terms)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.terms[mid] < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.terms) and self.terms[lo] == term:
+            return lo
+        return -1
+
+    def __contains__(self, term: str) -> bool:
+        return self._find(term) >= 0
+
+    def __getitem__(self, term: str) -> int:
+        term_id = self._find(term)
+        if term_id < 0:
+            raise KeyError(term)
+        return term_id
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def as_array(self, block_elements: int = 1 << 22) -> np.ndarray:
+        """All terms, in term id order, as a fixed-width bytes array gathered straight from the blob"""
+        offsets, blob = self.terms.offsets, self.terms.blob
+        lengths = np.diff(offsets)
+        if not len(lengths) or not len(blob):
+            return np.zeros(len(lengths), dtype="S1")
+        width = max(int(lengths.max()), 1)
+        columns = np.arange(width)
+        out = np.zeros((len(lengths), width), dtype=np.uint8)
+        # Row blocks bound the temporary index matrix for long vocabularies
+        step = max(block_elements // width, 1)
+        for start in range(0, len(lengths), step):
+            stop = min(start + step, len(lengths))
+            index = np.minimum(offsets[start:stop, None] + columns, len(blob) - 1)
+            out[start:stop] = np.where(columns < lengths[start:stop, None], blob[index], 0)
+        return out.view(f"S{width}").ravel()
+
+
+def _encode_strings(values: List[str]):
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def write_index(file_path: str, engine: SparseBM25, chunk_ids: List[str]):
+    terms = sorted(engine.vocab, key=engine.vocab.__getitem__)
+    if terms != sorted(terms):
+        raise ValueError("BM25 vocabulary must be in sorted term order to be written")
+    term_offsets, term_blob = _encode_strings(terms)
+    id_offsets, id_blob = _encode_strings(list(chunk_ids))
+    arrays = {
+        "term_offsets": term_offsets,
+        "term_blob": term_blob,
+        "indptr": engine.indptr,
+        "doc_ids": engine.doc_ids,
+        "tfs": engine.tfs,
+        "doc_len": engine.doc_len,
+        "idf": engine.idf,
+        "id_offsets": id_offsets,
+        "id_blob": id_blob,
+    }
+
+    offset = _HEADER.size + _TABLE.size
+    table, payloads = [], []
+    for name, dtype in _SECTIONS:
+        data = np.ascontiguousarray(arrays[name], dtype=dtype).tobytes()
+        padding = -offset % 8
+        offset += padding
+        table.extend([offset, len(data)])
+        payloads.append(b"\x00" * padding + data)
+        offset += len(data)
+
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION,
+        engine.corpus_size, len(terms), len(engine.doc_ids),
+        engine.k1, engine.b, engine.epsilon, engine.avgdl
+    )
+    # Write next to the target and swap in, so running workers keep their old mapping intact
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(_TABLE.pack(*table))
+        for payload in payloads:
+            f.write(payload)
+    os.replace(tmp_path, file_path)
+
+
+def open_index(file_path: str):
+    """Returns (SparseBM25, chunk_ids) backed by a read-only mmap of file_path"""
+    with open(file_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped) < _HEADER.size + _TABLE.size:
+        raise ValueError(f"{file_path} is too small to be a BM25 index")
+    magic, version, num_docs, num_terms, num_postings, k1, b, epsilon, avgdl = _HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{file_path} is not a BM25 index (bad magic {magic!r})")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{file_path} has BM25 format version {version}, expected {FORMAT_VERSION}; rebuild the index")
+
+    table = _TABLE.unpack_from(mapped, _HEADER.size)
+    sections = {}
+    for i, (name, dtype) in enumerate(_SECTIONS):
+        offset, nbytes = table[2 * i], table[2 * i + 1]
+        if offset + nbytes > len(mapped):
+            raise ValueError(f"{file_path} is truncated (section {name})")
+        sections[name] = np.frombuffer(mapped, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize, offset=offset)
+
+    if len(sections["doc_len"]) != num_docs or len(sections["doc_ids"]) != num_postings or len(sections["idf"]) != num_terms:
+        raise ValueError(f"{file_path} header counts do not match its sections")
+
+    engine = SparseBM25(k1=k1, b=b, epsilon=epsilon)
+    engine.vocab = SortedVocab(MmapStrings(sections["term_offsets"], sections["term_blob"]))
+    engine.indptr = sections["indptr"]
+    engine.doc_ids = sections["doc_ids"]
+    engine.tfs = sections["tfs"]
+    engine.doc_len = sections["doc_len"]
+    engine.idf = sections["idf"]
+    engine.avgdl = avgdl
+    # Keep the mapping alive for as long as the engine's views are in use
+    engine.mmap = mapped
+    chunk_ids = MmapStrings(sections["id_offsets"], sections["id_blob"])
+    return engine, chunk_ids
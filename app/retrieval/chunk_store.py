@@ -0,0 +1,118 @@
+import json
+import mmap
+import os
+import threading
+import zlib
+from typing import Dict, List
+from app.core.config import settings
+from app.dataclasses import Chunk
+from app.logger import logging
+
+INDEX_VERSION = 1
+
+
+class ChunkStore:
+    """
+    Local disk-backed chunk text/metadata store keyed by Chunk.id.
+
+    Records are appended to `chunks.dat` (zlib-compressed JSON when enabled)
+    and located through `index.json` ({id: [offset, length, compressed]}).
+    Reads go through a read-only mmap of the data file, so context hydration
+    is a local lookup instead of a Pinecone fetch.
+    """
+    DATA_FILE = "chunks.dat"
+    INDEX_FILE = "index.json"
+
+    def __init__(self, store_path: str = None, compress: bool = None):
+        self.store_path = store_path or settings.CHUNK_STORE_PATH
+        self.compress = settings.CHUNK_STORE_COMPRESS if compress is None else compress
+        self.entries: Dict[str, list] = {}
+        self._mmap = None
+        self._lock = threading.Lock()
+        try:
+            self.load()
+        except Exception as e:
+            logging.error(f"ERROR in init block of ChunkStore {e}")
+
+    @property
+    def _data_path(self):
+        return os.path.join(self.store_path, self.DATA_FILE)
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.store_path, self.INDEX_FILE)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.entries
+
+    def load(self):
+        if not os.path.exists(self._index_path):
+            logging.info(f"No chunk store found at {self.store_path}, starting empty")
+            return
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("format_version") != INDEX_VERSION:
+            raise ValueError(
+                f"{self.store_path} has chunk store version {index.get('format_version')}, expected {INDEX_VERSION}"
+            )
+        # Remap before publishing the entries so no reader sees offsets past its mapping
+        self._remap()
+        self.entries = index["entries"]
+        logging.info(f"Loaded chunk store with {len(self.entries)} chunks from {self.store_path}")
+
+    def _remap(self):
+        # The old mapping is not closed here: concurrent get_many calls may still hold it
+        if os.path.exists(self._data_path) and os.path.getsize(self._data_path):
+            with open(self._data_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def put_many(self, chunks: List[Chunk]):
+        """Appends chunks that are not stored yet; existing ids are left untouched"""
+        try:
+            with self._lock:
+                new_chunks = {chunk.id: chunk for chunk in chunks if chunk.id not in self.entries}
+                if not new_chunks:
+                    logging.info("ChunkStore put_many: nothing new to store")
+                    return
+                os.makedirs(self.store_path, exist_ok=True)
+                entries = dict(self.entries)
+                with open(self._data_path, "ab") as f:
+                    offset = f.tell()
+                    for chunk_id, chunk in new_chunks.items():
+                        record = json.dumps({"text": chunk.text, "metadata": chunk.metadata}).encode("utf-8")
+                        if self.compress:
+                            record = zlib.compress(record)
+                        f.write(record)
+                        entries[chunk_id] = [offset, len(record), int(self.compress)]
+                        offset += len(record)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                # Index is swapped in after the data is on disk, so readers never see dangling offsets
+                with open(self._index_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump({"format_version": INDEX_VERSION, "entries": entries}, f)
+                os.replace(self._index_path + ".tmp", self._index_path)
+                # Remap before publishing the new entries so no reader sees offsets past its mapping
+                self._remap()
+                self.entries = entries
+                logging.info(f"ChunkStore put_many: stored {len(new_chunks)} chunk(s)")
+        except Exception as e:
+            logging.error(f"Error in put_many of ChunkStore {e}")
+
+    def get_many(self, ids: List[str]) -> Dict[str, dict]:
+        """Batched multi-get: returns {id: {"text", "metadata"}} for the ids that are stored"""
+        entries, mapped = self.entries, self._mmap
+        found = [(chunk_id, entries[chunk_id]) for chunk_id in ids if chunk_id in entries]
+        if not found or mapped is None:
+            return {}
+        results = {}
+        # Read in file order for sequential page access
+        for chunk_id, (offset, length, compressed) in sorted(found, key=lambda item: item[1][0]):
+            record = mapped[offset:offset + length]
+            if compressed:
+                record = zlib.decompress(record)
+            results[chunk_id] = json.loads(record)
+        return results
@@ -0,0 +1,100 @@
+import threading
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.core.tokenizer import count_tokens, split_sentences
+from app.logger import logging
+from app.retrieval.rerank_batcher import RerankBatcher
+
+
+class ContextCompressor:
+    """
+    Extractive compression of retrieved contexts before generation.
+
+    Every sentence of the retrieved chunks is scored against the query with the
+    already-loaded cross-encoder (through the rerank micro-batcher). The best
+    sentences are kept until CONTEXT_COMPRESSION_RATIO of the original tokens
+    (capped at CONTEXT_COMPRESSION_MAX_TOKENS when set) is used, and
+    each chunk is rebuilt from its kept sentences in their original order.
+    Chunks keep their rerank order, and chunks with nothing kept are dropped.
+    Without a rerank batcher (e.g. the retriever failed to initialize) it stays
+    disabled and contexts pass through unchanged.
+    """
+
+    def __init__(self, rerank_batcher: Optional[RerankBatcher], ratio: float = None, max_tokens: int = None, min_sentences: int = None):
+        self.rerank_batcher = rerank_batcher
+        self.enabled = settings.CONTEXT_COMPRESSION_ENABLED and rerank_batcher is not None
+        if settings.CONTEXT_COMPRESSION_ENABLED and rerank_batcher is None:
+            logging.warning("ContextCompressor: no rerank batcher available, context compression disabled")
+        self.ratio = ratio or settings.CONTEXT_COMPRESSION_RATIO
+        self.max_tokens = settings.CONTEXT_COMPRESSION_MAX_TOKENS if max_tokens is None else max_tokens
+        self.min_sentences = min_sentences or settings.CONTEXT_COMPRESSION_MIN_SENTENCES
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.sentences_in = 0
+        self.sentences_out = 0
+
+    async def compress(self, query: str, contexts: List[str]) -> Tuple[List[str], dict]:
+        """Returns (compressed contexts, metrics); contexts come back unchanged when disabled or on error"""
+        if not self.enabled or not contexts:
+            return contexts, {}
+        try:
+            sentences = [(i, sentence) for i, context in enumerate(contexts) for sentence in split_sentences(context)]
+            tokens = [count_tokens(sentence) for _, sentence in sentences]
+            total = sum(tokens)
+            if len(sentences) <= self.min_sentences:
+                return contexts, {}
+
+            target = total * self.ratio
+            if self.max_tokens:
+                target = min(target, self.max_tokens)
+
+            scored = await self.rerank_batcher.rerank(query, [sentence for _, sentence in sentences])
+            ranked = sorted(range(len(sentences)), key=lambda j: scored[j][1], reverse=True)
+            keep, kept_tokens = set(), 0
+            for j in ranked:
+                if len(keep) >= self.min_sentences and kept_tokens + tokens[j] > target:
+                    continue
+                keep.add(j)
+                kept_tokens += tokens[j]
+
+            # Original sentence order inside each chunk, chunks in rerank order
+            kept_by_context = {}
+            for j in sorted(keep):
+                i, sentence = sentences[j]
+                kept_by_context.setdefault(i, []).append(sentence)
+            compressed = [" ".join(kept_by_context[i]) for i in range(len(contexts)) if i in kept_by_context]
+
+            metrics = {
+                "tokens_in": total,
+                "tokens_out": kept_tokens,
+                "compression_ratio": round(kept_tokens / total, 3) if total else 1.0,
+                "sentences_in": len(sentences),
+                "sentences_out": len(keep),
+                "contexts_out": len(compressed),
+            }
+            with self._lock:
+                self.requests += 1
+                self.tokens_in += total
+                self.tokens_out += kept_tokens
+                self.sentences_in += len(sentences)
+                self.sentences_out += len(keep)
+            logging.info(f"Context compression: {metrics}")
+            return compressed, metrics
+
+        except Exception as e:
+            logging.error(f"Error in compress of ContextCompressor: {e}")
+            return contexts, {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "requests": self.requests,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "compression_ratio": round(self.tokens_out / self.tokens_in, 3) if self.tokens_in else 1.0,
+                "sentences_in": self.sentences_in,
+                "sentences_out": self.sentences_out,
+            }
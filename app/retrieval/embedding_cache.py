@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+from typing import Dict, List
+from app.core.config import settings
+from app.dataclasses import Chunk
+from app.logger import logging
+from app.retrieval.embedding_client import embed_corpus
+
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed embedding cache.
+
+    Vectors are packed float32 blobs in SQLite, keyed by
+    (content hash, embedding model, dimension). Chunk.id is already the
+    SHA-256 of the text, so an unchanged chunk is never embedded twice.
+    """
+    DB_FILE = "embeddings.sqlite"
+
+    def __init__(self, cache_path: str = None, model: str = None, dimension: int = None):
+        self.cache_path = cache_path or settings.EMBEDDING_CACHE_PATH
+        self.model = model or settings.EMBEDDING_MODEL
+        self.dimension = dimension or settings.EMBEDDING_DIMENSION
+        os.makedirs(self.cache_path, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.cache_path, self.DB_FILE), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "content_hash TEXT NOT NULL, model TEXT NOT NULL, dimension INTEGER NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (content_hash, model, dimension))"
+        )
+        self.conn.commit()
+
+    def __len__(self):
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM embeddings WHERE model = ? AND dimension = ?", (self.model, self.dimension)
+        ).fetchone()
+        return row[0]
+
+    def get_many(self, hashes: List[str], batch_size: int = 500) -> Dict[str, np.ndarray]:
+        """Returns {content_hash: float32 vector} for the hashes that are cached"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), batch_size):
+                batch = hashes[start:start + batch_size]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE model = ? AND dimension = ? "
+                    f"AND content_hash IN ({placeholders})",
+                    (self.model, self.dimension, *batch),
+                )
+                for content_hash, blob in rows:
+                    found[content_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[str, list]):
+        rows = []
+        for content_hash, vector in items.items():
+            vector = np.asarray(vector, dtype=np.float32)
+            if vector.shape != (self.dimension,):
+                logging.warning(f"Not caching embedding of size {vector.shape} for {content_hash}, expected {self.dimension}")
+                continue
+            rows.append((content_hash, self.model, self.dimension, vector.tobytes()))
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def embed_chunks(chunks: List[Chunk]) -> List[list]:
+    """Embeddings for chunks in order; only chunks the cache has never seen are sent to the API"""
+    cache = EmbeddingCache()
+    try:
+        cached = cache.get_many(list({chunk.id for chunk in chunks}))
+        missing = list({chunk.id: chunk.text for chunk in chunks if chunk.id not in cached}.items())
+        logging.info(f"Embedding cache: {len(cached)} hit(s), {len(missing)} chunk(s) to embed")
+        if missing:
+            fresh = embed_corpus([text for _, text in missing])
+            fresh = dict(zip((content_hash for content_hash, _ in missing), fresh))
+            cache.put_many(fresh)
+            cached.update({content_hash: np.asarray(vector, dtype=np.float32) for content_hash, vector in fresh.items()})
+        return [cached[chunk.id].tolist() for chunk in chunks]
+    finally:
+        cache.close()
@@ -1,6 +1,11 @@
 import requests,os
+import asyncio
+import random
+import httpx
 import numpy as np
 from typing import List
+from app.core.config import settings
+from app.core.tokenizer import count_tokens
 from app.logger import logging
 from dotenv import load_dotenv
 from requests.adapters import HTTPAdapter
@@ -45,7 +50,7 @@ class EuriEmbeddingClient:
                 logging.info("embeddings started and it is embed fucntion ")
                 payload={
                     "input": texts,
-                    "model": "text-embedding-3-small"
+                    "model": settings.EMBEDDING_MODEL
 
                 }
                 response=self.session.post(self.url,headers=self.headers,json=payload,
@@ -81,5 +86,142 @@ class EuriEmbeddingClient:
                 time.sleep(0.5 * attempt)
         return []
 
-            
 
+class AsyncEuriEmbeddingClient:
+    """
+    Async EURI embedding client for ingestion-scale corpora.
+
+    Texts are packed into token-aware batches (EMBED_BATCH_MAX_TOKENS /
+    EMBED_BATCH_MAX_SIZE), up to EMBED_MAX_CONCURRENCY batches are in flight
+    on one pooled httpx client, and each batch retries on timeouts, connection
+    errors, 429 and 5xx with jittered exponential backoff. Results come back
+    in input order. The pooled client lives until aclose().
+    """
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    MAX_BACKOFF_SECONDS = 30.0
+
+    def __init__(
+        self,
+        max_batch_tokens: int = None,
+        max_batch_size: int = None,
+        max_concurrency: int = None,
+        retries: int = None,
+        timeout: float = 60.0,
+    ):
+        self.url = os.getenv('EURI_API_URL')
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"
+        }
+        self.model = settings.EMBEDDING_MODEL
+        self.max_batch_tokens = max_batch_tokens or settings.EMBED_BATCH_MAX_TOKENS
+        self.max_batch_size = max_batch_size or settings.EMBED_BATCH_MAX_SIZE
+        self.max_concurrency = max_concurrency or settings.EMBED_MAX_CONCURRENCY
+        # Attempts per batch; at least one, or embed_batch would never call the API
+        self.retries = max(1, retries or settings.EMBED_MAX_RETRIES)
+        self.timeout = timeout
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so the pool binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+            self._client = httpx.AsyncClient(headers=self.headers, timeout=self.timeout, limits=limits)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Greedily packs text indices into batches under the token and size limits"""
+        batches, current, current_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        if retry_after:
+            try:
+                # Honoured, but capped like the jittered path: a batch is never parked for an hour
+                return min(self.MAX_BACKOFF_SECONDS, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        # Full jitter keeps concurrent batches from retrying in lockstep
+        return random.uniform(0, min(self.MAX_BACKOFF_SECONDS, 0.5 * 2 ** attempt))
+
+    async def embed_batch(self, texts: List[str], batch_no: int = 0) -> List[List[float]]:
+        """One embedding request (with retries) for texts that fit a single batch"""
+        for attempt in range(1, self.retries + 1):
+            retry_after = None
+            try:
+                response = await self.client.post(self.url, json={"input": texts, "model": self.model})
+                if response.status_code in self.RETRY_STATUS:
+                    retry_after = response.headers.get("retry-after")
+                    raise httpx.HTTPStatusError(
+                        f"Embedding api returned {response.status_code}", request=response.request, response=response
+                    )
+                if response.status_code != 200:
+                    # Other 4xx (bad input, auth) will not get better by retrying
+                    raise Exception(f"Embedding api failed {response.status_code}: {response.text}")
+                data = sorted(response.json().get("data", []), key=lambda d: d.get("index", 0))
+                embeddings = [d["embedding"] for d in data]
+                if len(embeddings) != len(texts):
+                    raise Exception(f"Embedding api returned {len(embeddings)} vectors for {len(texts)} texts")
+                return embeddings
+            except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as e:
+                if attempt == self.retries:
+                    logging.error(f"❌ Embedding batch {batch_no} failed after {attempt} attempts: {e}")
+                    raise
+                delay = self._backoff(attempt, retry_after)
+                logging.warning(f"Embedding batch {batch_no} attempt {attempt}/{self.retries} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds any number of texts; raises if a batch still fails after its retries"""
+        if not texts:
+            return []
+        batches = self.make_batches(texts)
+        logging.info(f"Embedding {len(texts)} texts in {len(batches)} batches, {self.max_concurrency} in flight")
+        results: List[List[float]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        done = 0
+
+        async def run(batch_no: int, indices: List[int]):
+            nonlocal done
+            async with semaphore:
+                embeddings = await self.embed_batch([texts[i] for i in indices], batch_no)
+            for i, embedding in zip(indices, embeddings):
+                results[i] = embedding
+            done += 1
+            if done % 10 == 0 or done == len(batches):
+                logging.info(f"Embedded {done}/{len(batches)} batches")
+
+        tasks = [asyncio.ensure_future(run(batch_no, indices)) for batch_no, indices in enumerate(batches)]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        return results
+
+
+def embed_corpus(texts: List[str]) -> List[List[float]]:
+    """Blocking entry point for ingestion scripts"""
+    async def run():
+        client = AsyncEuriEmbeddingClient()
+        try:
+            return await client.embed(texts)
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
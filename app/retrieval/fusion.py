@@ -0,0 +1,43 @@
+from typing import Dict, List, Sequence, Tuple
+
+Ranking = Sequence[Tuple[str, float]]
+
+
+def reciprocal_rank_fusion(rankings: List[Ranking], weights: List[float] = None, k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Weighted RRF: score(d) = sum_i w_i / (k + rank_i(d)), ranks starting at 1.
+    Each ranking is a best-first list of (doc_id, score); only the order is used.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+
+def linear_fusion(rankings: List[Ranking], weights: List[float] = None) -> List[Tuple[str, float]]:
+    """
+    Weighted sum of min-max normalised scores. A document missing from a
+    ranking contributes 0 for it, so BM25 and cosine scales can be mixed.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        scores = [score for _, score in ranking]
+        low, high = min(scores), max(scores)
+        span = high - low
+        for doc_id, score in ranking:
+            normalized = (score - low) / span if span else 1.0
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * normalized
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+
+def fuse(rankings: List[Ranking], method: str = "rrf", weights: List[float] = None, rrf_k: int = 60) -> List[Tuple[str, float]]:
+    if method == "rrf":
+        return reciprocal_rank_fusion(rankings, weights, rrf_k)
+    if method == "linear":
+        return linear_fusion(rankings, weights)
+    raise ValueError(f"Unknown fusion method '{method}', expected 'rrf' or 'linear'")
@@ -1,13 +1,20 @@
 from typing import List
 from app.retrieval.bm25 import BM25Manager
+from app.retrieval.chunk_store import ChunkStore
 from app.retrieval.reranker import CrossEncoderReranker
-from app.retrieval.pinecone_manager import PineconeManager
+from app.retrieval.token_cache import PassageTokenCache
+from app.retrieval.rerank_batcher import RerankBatcher
+from app.retrieval.vector_store import get_vector_store
 from app.retrieval.embedding_client import EuriEmbeddingClient
+from app.retrieval.fusion import fuse
+from app.cache.retrieval_cache import RetrievalCache
 from app.core.config import settings
+from app.core.corpus_version import CorpusVersion
 from app.logger import logging
 from app.tracking.mlflow_manager import MLflowManager
 import numpy as np
 import asyncio
+import time
 from concurrent.futures import ThreadPoolExecutor
 
 executor = ThreadPoolExecutor(max_workers=4)
@@ -17,95 +24,220 @@ class HybridRetriever:
         try:
             logging.info("Initializing HybridRetriever")
             self.bm25=BM25Manager()
-            self.bm25.load("bm25_index.pkl")
-            self.pinecone=PineconeManager()
+            self.bm25.load()
+            self.vector_store=get_vector_store()
+            self.chunk_store=ChunkStore()
             self.embedder=EuriEmbeddingClient()
-            self.reranker=CrossEncoderReranker()
+            self.reranker=CrossEncoderReranker(batch_size=settings.RERANK_BATCH_MAX_SIZE)
+            self.rerank_batcher=RerankBatcher(self.reranker)
+            self.retrieval_cache=RetrievalCache()
+            self.corpus=CorpusVersion()
+            self._corpus_version=None
+            self._reload_task=None
+            self._reload_retry_at=0.0
         except Exception as e:
             logging.error(f"Error initializing HybridRetriever: {e}")
 
+    @property
+    def corpus_version(self) -> str:
+        """
+        Version stamped by the last ingestion (BM25 generation if never stamped).
+        Every cache namespaces its keys with it, so a re-ingestion invalidates
+        them all in O(1). On a change the old version keeps being served while
+        a single background task loads the new indexes off the event loop;
+        the version only moves once they are swapped in, so nothing gets
+        cached under the new version from the old index.
+        """
+        version = self.corpus.current() or f"bm25-{self.bm25.generation}"
+        if self._corpus_version is None:
+            self._corpus_version = version
+        elif version != self._corpus_version:
+            self._schedule_reload(version)
+        return self._corpus_version
+
+    def _schedule_reload(self, version: str):
+        if self._reload_task is not None and not self._reload_task.done():
+            return
+        if time.monotonic() < self._reload_retry_at:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the server (scripts, evaluation): nothing to block, reload inline
+            try:
+                self._swap_indexes(version, self._load_indexes())
+            except Exception as e:
+                self._reload_retry_at = time.monotonic() + self.corpus.refresh_seconds
+                logging.error(f"Error reloading indexes in HybridRetriever: {e}")
+            return
+        logging.info(f"Corpus version changed {self._corpus_version} -> {version}, reloading indexes")
+        self._reload_task = loop.create_task(self._reload_indexes(version))
+
+    async def _reload_indexes(self, version: str):
+        try:
+            loop = asyncio.get_running_loop()
+            indexes = await loop.run_in_executor(executor, self._load_indexes)
+            self._swap_indexes(version, indexes)
+        except Exception as e:
+            # Keep serving the old version; retry once the stamp is re-read
+            self._reload_retry_at = time.monotonic() + self.corpus.refresh_seconds
+            logging.error(f"Error reloading indexes in HybridRetriever: {e}")
+
+    def _load_indexes(self) -> dict:
+        """Builds fresh index instances from disk (runs in the executor, never on the event loop)"""
+        bm25 = BM25Manager()
+        bm25.load()
+        indexes = {
+            "bm25": bm25,
+            "chunk_store": ChunkStore(),
+            "token_cache": PassageTokenCache(self.reranker.model_name),
+            "vector_store": self.vector_store,
+        }
+        if hasattr(self.vector_store, "load"):
+            indexes["vector_store"] = get_vector_store()
+        return indexes
+
+    def _swap_indexes(self, version: str, indexes: dict):
+        """Swaps every index and the version together (no await in between, so requests see all old or all new)"""
+        self.bm25 = indexes["bm25"]
+        self.chunk_store = indexes["chunk_store"]
+        self.reranker.token_cache = indexes["token_cache"]
+        self.vector_store = indexes["vector_store"]
+        self._corpus_version = version
+        logging.info(f"Indexes reloaded, serving corpus version {version}")
+
+    async def _hydrate(self, doc_ids: List[str], matches: list = ()) -> dict:
+        """{id: {"text", "metadata"}} from the local chunk store, then dense match metadata, then the vector store"""
+        fetched = self.chunk_store.get_many(doc_ids)
+        for match in matches:
+            text = (match.metadata or {}).get("text")
+            if str(match.id) not in fetched and text:
+                fetched[str(match.id)] = {"text": text, "metadata": match.metadata}
+        missing = [doc_id for doc_id in doc_ids if doc_id not in fetched]
+        if missing:
+            logging.info(f"{len(missing)} chunk(s) not in local chunk store, fetching from vector store")
+            loop = asyncio.get_running_loop()
+            remote = await loop.run_in_executor(executor, self.vector_store.fetch_by_ids, missing)
+            for doc_id, v in remote.get("vectors", {}).items():
+                fetched[doc_id] = {"text": v.get("metadata", {}).get("text"), "metadata": v.get("metadata", {})}
+        return fetched
+
     async def hybrid_search(
                 self,
                 query: str,
                 query_embedding: list,
-                top_k: int = 5
+                top_k: int = 5,
+                rerank_candidates: int = None,
+                final_k: int = None
             ) -> List[str]:
+        """
+        BM25 + dense retrieval, fused (RRF or linear), then the top
+        `rerank_candidates` fused hits go through the cross-encoder and the
+        best `final_k` (defaults to top_k) texts are returned. The ranked chunk
+        ids are cached per normalized query and corpus version, so a repeat
+        only re-hydrates the texts.
+        """
 
         try:
             loop = asyncio.get_running_loop()
             logging.info(f"Starting hybrid search in HybridRetriever with query: {query}")
-
-            # 1️⃣ Parallel BM25 + Pinecone
+            final_k = final_k or top_k
+            rerank_candidates = max(rerank_candidates or settings.RERANK_CANDIDATES, final_k)
+            depth = max(settings.RETRIEVAL_CANDIDATES, rerank_candidates)
+            corpus_version = self.corpus_version
+
+            # 0️⃣ Same question already retrieved on this corpus (any session)
+            cached = await self.retrieval_cache.get(query, final_k, rerank_candidates, corpus_version)
+            if cached:
+                cached_ids = [doc_id for doc_id, _ in cached]
+                fetched = await self._hydrate(cached_ids)
+                if all(fetched.get(doc_id, {}).get("text") for doc_id in cached_ids):
+                    logging.info(f"Retrieval cache HIT ({len(cached_ids)} chunks)")
+                    return [fetched[doc_id]["text"] for doc_id in cached_ids]
+                logging.warning("Retrieval cache entry references missing chunks, recomputing")
+
+            # 1️⃣ Parallel BM25 + dense vector search
             bm25_task = loop.run_in_executor(
-                executor, self.bm25.search, query, top_k
+                executor, self.bm25.search, query, depth
             )
 
-            pinecone_task = loop.run_in_executor(
+            dense_task = loop.run_in_executor(
                 executor,
-                lambda: self.pinecone.index.query(
+                lambda: self.vector_store.query(
                     vector=query_embedding,
-                    top_k=top_k,
-                    include_metadata=True,
-                    namespace=self.pinecone.namespace
+                    top_k=depth,
+                    include_metadata=True
                 )
             )
 
-            bm25_results, pinecone_results = await asyncio.gather(
-                bm25_task, pinecone_task
+            bm25_results, dense_results = await asyncio.gather(
+                bm25_task, dense_task
             )
 
             # 2️⃣ Normalize IDs (🔥 CRITICAL FIX 🔥)
-            bm25_ids = [str(doc_id) for doc_id, _ in bm25_results]
+            bm25_ranking = [(str(doc_id), score) for doc_id, score in bm25_results or []]
 
-            pinecone_ids = [
-                str(match.id)
-                for match in pinecone_results.matches
-                if match.id is not None
-            ]
+            matches = [match for match in dense_results.matches if match.id is not None]
+            dense_ranking = [(str(match.id), match.score) for match in matches]
 
-            all_ids = list(set(bm25_ids + pinecone_ids))
             # If top result score is strong, skip rerank
-            matches = pinecone_results.matches
-            logging.info(f"score of pinecone results:{matches[0].score}")
+            if matches:
+                logging.info(f"score of dense results:{matches[0].score}")
             if matches and matches[0].score >= 0.85:
-                logging.info("High-confidence Pinecone result, skipping rerank")
-                return [
-                    m.metadata["text"]
-                    for m in matches[:top_k]
-                    if m.metadata and "text" in m.metadata
-                ]
-            if not all_ids:
-                logging.warning("No document IDs found from BM25 or Pinecone")
+                logging.info("High-confidence dense result, skipping rerank")
+                top = [m for m in matches[:final_k] if m.metadata and "text" in m.metadata]
+                await self.retrieval_cache.set(
+                    query, final_k, rerank_candidates, corpus_version,
+                    [(str(m.id), float(m.score)) for m in top]
+                )
+                return [m.metadata["text"] for m in top]
+
+            # 3️⃣ Fuse the two rankings
+            fused = fuse(
+                [bm25_ranking, dense_ranking],
+                method=settings.FUSION_METHOD,
+                weights=[settings.BM25_WEIGHT, settings.DENSE_WEIGHT],
+                rrf_k=settings.RRF_K
+            )
+            fused_ids = [doc_id for doc_id, _ in fused]
+            if not fused_ids:
+                logging.warning("No document IDs found from BM25 or vector store")
                 return []
 
-            # 3️⃣ Fetch documents
-            fetched = self.pinecone.fetch_by_ids(all_ids)
-
-            contexts = [
-                v["metadata"]["text"]
-                for v in fetched.get("vectors", {}).values()
-                if v.get("metadata", {}).get("text") and len(v["metadata"]["text"]) > 40
-            ]
+            # 4️⃣ Hydrate only the best fused candidates (chunk store, then dense match
+            # metadata, then the vector store); the next window is fetched only when
+            # missing or too-short texts leave the rerank budget unfilled
+            fetched, context_ids, start = {}, [], 0
+            while len(context_ids) < rerank_candidates and start < len(fused_ids):
+                window = fused_ids[start:start + rerank_candidates - len(context_ids)]
+                start += len(window)
+                fetched.update(await self._hydrate(window, matches))
+                # Keep fused order so the rerank budget goes to the best fused candidates
+                context_ids.extend(
+                    doc_id
+                    for doc_id in window
+                    if doc_id in fetched and fetched[doc_id].get("text") and len(fetched[doc_id]["text"]) > 40
+                )
+            contexts = [fetched[doc_id]["text"] for doc_id in context_ids]
 
             if not contexts:
                 logging.warning("No valid contexts found after fetch")
                 return []
 
-            # ⚠️ Cap before reranking
-            contexts = contexts[:6]
-
-
-
-            # 4️⃣ Rerank
-            reranked = await loop.run_in_executor(
-                executor,
-                self.reranker.rerank,
-                query,
-                contexts
+            # 5️⃣ Rerank (cached scores first, misses batched with concurrent requests into one forward pass,
+            # passages come pre-tokenized from the token cache by chunk id)
+            reranked = await self.rerank_batcher.rerank(query, contexts, ids=context_ids, corpus_version=corpus_version)
+
+            # rerank() keeps input order, so ids line up with the scores
+            ranked = sorted(
+                ((doc_id, float(score), text) for doc_id, (text, score) in zip(context_ids, reranked)),
+                key=lambda x: x[1], reverse=True
+            )[:final_k]
+            await self.retrieval_cache.set(
+                query, final_k, rerank_candidates, corpus_version,
+                [(doc_id, score) for doc_id, score, _ in ranked]
             )
-
-            reranked.sort(key=lambda x: x[1], reverse=True)
-            final_contexts = [text for text, _ in reranked[:top_k]]
+            final_contexts = [text for _, _, text in ranked]
 
             return final_contexts
 
@@ -0,0 +1,155 @@
+import json
+import os
+import numpy as np
+from typing import List
+from app.core.config import settings
+from app.dataclasses import Chunk, VectorMatch, VectorQueryResult
+from app.logger import logging
+from app.retrieval.embedding_cache import embed_chunks
+
+
+class LocalVectorStore:
+    """
+    In-process dense vector index with the same interface as PineconeManager.
+
+    Vectors are L2-normalised float32 rows in `vectors.npy`, opened with
+    np.load(mmap_mode="r") so every worker shares the pages through the OS
+    page cache. Ids and metadata live next to it in `metadata.json`.
+    Scores are cosine similarity, same metric as the Pinecone index.
+    """
+    VECTORS_FILE = "vectors.npy"
+    METADATA_FILE = "metadata.json"
+
+    def __init__(self, index_path: str = None, dimension: int = None):
+        self.index_path = index_path or settings.LOCAL_VECTOR_STORE_PATH
+        self.namespace = "default"
+        self.dimension = dimension or settings.EMBEDDING_DIMENSION
+        self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+        self.ids: List[str] = []
+        self.metadata: List[dict] = []
+        self.id_to_row = {}
+        try:
+            self.load()
+        except Exception as e:
+            logging.error(f"ERROR in init block of LocalVectorStore {e}")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.index_path, self.VECTORS_FILE)
+
+    @property
+    def _metadata_path(self):
+        return os.path.join(self.index_path, self.METADATA_FILE)
+
+    def load(self):
+        if not os.path.exists(self._vectors_path):
+            logging.info(f"No local vector store found at {self.index_path}, starting empty")
+            return
+        vectors = np.load(self._vectors_path, mmap_mode="r")
+        with open(self._metadata_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        # Swapped in together at the end, so a reload never exposes half-updated state
+        self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(stored["ids"])}
+        self.metadata = stored["metadata"]
+        self.ids = stored["ids"]
+        self.vectors = vectors
+        if self.vectors.shape[0]:
+            self.dimension = self.vectors.shape[1]
+        logging.info(f"Loaded local vector store with {len(self.ids)} vectors from {self.index_path}")
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def upsert_chunks(self, chunks: List[Chunk], embeddings: List[list], batch_size: int = 100):
+        try:
+            logging.info("upserting chunks into local vector store through upsert_chunks function")
+            vectors = np.array(self.vectors, dtype=np.float32)
+            ids = list(self.ids)
+            metadata = list(self.metadata)
+            id_to_row = dict(self.id_to_row)
+
+            new_rows = []
+            for chunk, vector in zip(chunks, embeddings):
+                row_metadata = {**chunk.metadata, "text": chunk.text}
+                row_vector = self._normalize(np.asarray([vector], dtype=np.float32))[0]
+                if chunk.id in id_to_row:
+                    vectors[id_to_row[chunk.id]] = row_vector
+                    metadata[id_to_row[chunk.id]] = row_metadata
+                    continue
+                id_to_row[chunk.id] = len(ids)
+                ids.append(chunk.id)
+                metadata.append(row_metadata)
+                new_rows.append(row_vector)
+
+            if new_rows:
+                vectors = np.vstack([vectors.reshape(-1, len(new_rows[0])), np.stack(new_rows)])
+            self._write(vectors, ids, metadata)
+            self.load()
+            logging.info("embedding inserted into local vector store successfully")
+        except Exception as e:
+            logging.error(f"Error inserting into local vector store {e}")
+
+    def _write(self, vectors: np.ndarray, ids: List[str], metadata: List[dict]):
+        # Write to temp files and swap them in so readers never see a half-written index
+        os.makedirs(self.index_path, exist_ok=True)
+        tmp_vectors = self._vectors_path + ".tmp.npy"
+        tmp_metadata = self._metadata_path + ".tmp"
+        np.save(tmp_vectors, vectors.astype(np.float32))
+        with open(tmp_metadata, "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "metadata": metadata}, f)
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_metadata, self._metadata_path)
+
+    def query(self, vector: list, top_k: int = 5, include_metadata: bool = True) -> VectorQueryResult:
+        if not self.ids:
+            return VectorQueryResult(matches=[], namespace=self.namespace)
+        query_vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if norm:
+            query_vector = query_vector / norm
+
+        scores = self.vectors @ query_vector
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        matches = [
+            VectorMatch(
+                id=self.ids[row],
+                score=float(scores[row]),
+                metadata=self.metadata[row] if include_metadata else {}
+            )
+            for row in top
+        ]
+        return VectorQueryResult(matches=matches, namespace=self.namespace)
+
+    def get_index_stats(self):
+        return {
+            "dimension": self.dimension,
+            "total_vector_count": len(self.ids),
+            "namespaces": {self.namespace: {"vector_count": len(self.ids)}},
+        }
+
+    def fetch_by_ids(self, ids: list):
+        """Fetch text/metadata for chunk IDs, same shape as Pinecone fetch"""
+        vectors = {}
+        for chunk_id in ids:
+            row = self.id_to_row.get(chunk_id)
+            if row is None:
+                continue
+            vectors[chunk_id] = {"id": chunk_id, "metadata": self.metadata[row]}
+        return {"namespace": self.namespace, "vectors": vectors}
+
+    def initiate_embeddings(self, unique_chunks):
+        try:
+            logging.info("Initiating the embeddings and insert vectors into local vector store")
+            # Content-addressed cache: only never-seen chunks reach the embedding API
+            embeddings = embed_chunks(unique_chunks)
+            print(f"Embeddings generated: {len(embeddings)}")
+            self.upsert_chunks(unique_chunks, embeddings=embeddings)
+            logging.info("Initiate embeddings is completed ")
+        except Exception as e:
+            logging.error(f"Error in initiate_embeddings {e}")
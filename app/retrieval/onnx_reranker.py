@@ -0,0 +1,218 @@
+import inspect
+import os
+import shutil
+import sys
+import uuid
+import numpy as np
+from typing import List, Tuple
+from app.core.config import settings
+from app.logger import logging
+
+
+def model_slug(model_name: str) -> str:
+    return model_name.replace("/", "__")
+
+
+INT8_MODEL_FILE = "model-int8.onnx"
+
+
+def model_path(model_name: str, model_dir: str = None) -> str:
+    return os.path.join(model_dir or settings.ONNX_MODEL_DIR, model_slug(model_name), INT8_MODEL_FILE)
+
+
+def export_quantized(model_name: str, model_dir: str) -> str:
+    """
+    Offline export of a Hugging Face cross-encoder to ONNX followed by dynamic
+    int8 quantization. Needs torch/transformers/onnx only at export time; the
+    tokenizer is saved next to the model so serving stays offline.
+
+    Everything is written to a private temp directory and renamed into
+    model_dir, the int8 model last, so a concurrent reader or exporter never
+    sees a half-written model.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(model_dir, exist_ok=True)
+    work_dir = os.path.join(model_dir, f".export-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    os.makedirs(work_dir)
+    fp32_path = os.path.join(work_dir, "model.onnx")
+    int8_path = os.path.join(work_dir, INT8_MODEL_FILE)
+
+    logging.info(f"Exporting {model_name} to ONNX in {model_dir}")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    sample = tokenizer(["what is a cross encoder"], ["a model scoring query/passage pairs"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    # Newer torch defaults to the dynamo exporter (needs onnxscript); stick to the TorchScript one
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names}, "logits": {0: "batch"}},
+            opset_version=14,
+            **legacy,
+        )
+    try:
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        tokenizer.save_pretrained(work_dir)
+        names = sorted(os.listdir(work_dir), key=lambda name: name == INT8_MODEL_FILE)
+        for name in names:
+            os.replace(os.path.join(work_dir, name), os.path.join(model_dir, name))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    logging.info(f"Quantized ONNX reranker written to {os.path.join(model_dir, INT8_MODEL_FILE)}")
+    return os.path.join(model_dir, INT8_MODEL_FILE)
+
+
+def ensure_exported(model_name: str = None, model_dir: str = None) -> str:
+    """Exports the int8 model unless it is already there; run at ingestion/deploy time, never while serving"""
+    model_name = model_name or settings.RERANKER_MODEL
+    path = model_path(model_name, model_dir)
+    if os.path.exists(path):
+        return path
+    return export_quantized(model_name, os.path.dirname(path))
+
+
+class OnnxCrossEncoder:
+    """
+    Drop-in replacement for sentence_transformers.CrossEncoder.predict backed by
+    an int8 ONNX model on onnxruntime (CPU). Scores go through the same sigmoid
+    CrossEncoder applies for single-label models, so they are comparable.
+    """
+
+    def __init__(self, model_name: str, model_dir: str = None, max_length: int = 512, num_threads: int = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_length = max_length
+        path = model_path(model_name, model_dir)
+        self.model_dir = os.path.dirname(path)
+        if not os.path.exists(path):
+            # Exporting needs torch + onnx and minutes of CPU: never do it inside a serving worker
+            raise FileNotFoundError(
+                f"No exported ONNX reranker at {path}; run `python -m app.retrieval.onnx_reranker export` first"
+            )
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        num_threads = settings.ONNX_NUM_THREADS if num_threads is None else num_threads
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        logging.info(f"Loaded ONNX reranker from {path}")
+
+    def run_features(self, features: dict) -> np.ndarray:
+        """Runs already-tokenized features (numpy arrays) through the model and returns sigmoid scores"""
+        feeds = {name: np.asarray(value, dtype=np.int64) for name, value in features.items() if name in self.input_names}
+        logits = self.session.run(["logits"], feeds)[0]
+        return 1 / (1 + np.exp(-logits[:, 0]))
+
+    def predict(self, pairs: List[Tuple[str, str]], batch_size: int = 64, show_progress_bar: bool = False) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            features = self.tokenizer(
+                [query for query, _ in batch],
+                [passage for _, passage in batch],
+                padding=True,
+                truncation="longest_first",
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            scores.append(self.run_features(features))
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+
+PARITY_PAIRS = [
+    ("What is the doctor to patient ratio in India?", "India has roughly one doctor for every 1,500 people, below the WHO norm."),
+    ("What is the doctor to patient ratio in India?", "The monsoon season brings heavy rainfall to the western coast."),
+    ("How is public health spending split?", "Public health spending is shared between the central and state governments."),
+    ("How is public health spending split?", "Private hospitals account for most hospital beds in urban areas."),
+    ("What are the main non-communicable diseases?", "Cardiovascular disease, diabetes and cancer are the leading non-communicable diseases."),
+    ("What are the main non-communicable diseases?", "Vaccination coverage for measles has improved over the last decade."),
+]
+
+
+def check_parity(
+    pairs: List[Tuple[str, str]] = None,
+    model_name: str = None,
+    max_abs_diff: float = None,
+    top_k: int = None,
+    min_agreement: float = None,
+) -> dict:
+    """
+    Compares ONNX int8 scores with the PyTorch CrossEncoder on the same pairs.
+    Passes only if no score differs by more than `max_abs_diff` and at least
+    `min_agreement` of the queries keep the same top-k order; defaults come
+    from the ONNX_PARITY_* settings.
+    """
+    from sentence_transformers import CrossEncoder
+
+    pairs = pairs or PARITY_PAIRS
+    model_name = model_name or settings.RERANKER_MODEL
+    max_abs_diff = settings.ONNX_PARITY_MAX_ABS_DIFF if max_abs_diff is None else max_abs_diff
+    top_k = top_k or settings.ONNX_PARITY_TOP_K
+    min_agreement = settings.ONNX_PARITY_MIN_AGREEMENT if min_agreement is None else min_agreement
+    ensure_exported(model_name)
+    torch_scores = np.asarray(CrossEncoder(model_name).predict(pairs), dtype=np.float64)
+    onnx_scores = np.asarray(OnnxCrossEncoder(model_name).predict(pairs), dtype=np.float64)
+    return parity_report(pairs, torch_scores, onnx_scores, max_abs_diff, top_k, min_agreement)
+
+
+def parity_report(
+    pairs: List[Tuple[str, str]],
+    torch_scores: np.ndarray,
+    onnx_scores: np.ndarray,
+    max_abs_diff: float,
+    top_k: int,
+    min_agreement: float,
+) -> dict:
+    """Score differences and per-query top-k agreement of two score arrays, with a pass/fail verdict"""
+    by_query = {}
+    for index, (query, _) in enumerate(pairs):
+        by_query.setdefault(query, []).append(index)
+    same_ranking = sum(
+        list(rows[np.argsort(-torch_scores[rows], kind="stable")][:top_k])
+        == list(rows[np.argsort(-onnx_scores[rows], kind="stable")][:top_k])
+        for rows in map(np.asarray, by_query.values())
+    )
+    diff = np.abs(np.asarray(torch_scores, dtype=np.float64) - np.asarray(onnx_scores, dtype=np.float64))
+    report = {
+        "pairs": len(pairs),
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "top_k": top_k,
+        "ranking_agreement": same_ranking / len(by_query),
+    }
+    report["passed"] = report["max_abs_diff"] <= max_abs_diff and report["ranking_agreement"] >= min_agreement
+    if report["passed"]:
+        logging.info(f"ONNX reranker parity passed: {report}")
+    else:
+        logging.error(
+            f"ONNX reranker parity FAILED (max_abs_diff <= {max_abs_diff}, "
+            f"top-{top_k} agreement >= {min_agreement} required): {report}"
+        )
+    return report
+
+
+if __name__ == "__main__":
+    # python -m app.retrieval.onnx_reranker [export|parity]
+    command = sys.argv[1] if len(sys.argv) > 1 else "parity"
+    if command == "export":
+        print(ensure_exported())
+    elif command == "parity":
+        report = check_parity()
+        print(report)
+        if not report["passed"]:
+            sys.exit(1)
+    else:
+        sys.exit(f"Unknown command '{command}', expected 'export' or 'parity'")
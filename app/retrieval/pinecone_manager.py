@@ -5,7 +5,8 @@ from dotenv import load_dotenv
 load_dotenv()
 import os
 from app.logger import logging
-from app.retrieval.embedding_client import EuriEmbeddingClient
+from app.core.config import settings
+from app.retrieval.embedding_cache import embed_chunks
 
 class PineconeManager:
     def __init__(self):
@@ -18,7 +19,7 @@ class PineconeManager:
             if self.index_name not in [i["name"] for i in self.pc.list_indexes()]:
                 self.pc.create_index(
                     name=self.index_name,
-                    dimension=1536,
+                    dimension=settings.EMBEDDING_DIMENSION,
                     metric='cosine',
                     spec=ServerlessSpec(
                         cloud='aws',
@@ -54,6 +55,14 @@ class PineconeManager:
             logging.error(f"Error inserting into pinecone {e}")
 
 
+    def query(self, vector: list, top_k: int = 5, include_metadata: bool = True):
+        return self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            namespace=self.namespace
+        )
+
     def get_index_stats(self):
         return self.index.describe_index_stats()
     
@@ -65,9 +74,8 @@ class PineconeManager:
     def initiate_embeddings(self,unique_chunks):
         try:
             logging.info("Initiating the embeddings and insert vectors into pinecone db")
-            embedder=EuriEmbeddingClient()
-            chunk_text=[chunk.text for chunk in unique_chunks]
-            embeddings=embedder.embed(chunk_text)
+            # Content-addressed cache: only never-seen chunks reach the embedding API
+            embeddings=embed_chunks(unique_chunks)
             print("Embedding length example:", len(embeddings[0]))
             print(f"Embeddings generated: {len(embeddings)}")
             self.upsert_chunks(unique_chunks,embeddings=embeddings)
@@ -0,0 +1,74 @@
+import asyncio
+import numpy as np
+from typing import Dict, List
+from app.cache.lru import LRUCache
+from app.cache.utils import normalize_query
+from app.core.config import settings
+from app.core.micro_batcher import MicroBatcher
+from app.logger import logging
+from app.retrieval.embedding_client import AsyncEuriEmbeddingClient
+
+
+class QueryEmbedder:
+    """
+    Non-blocking query embedding for the /ask path.
+
+    Questions from concurrent requests arriving within QUERY_EMBED_BATCH_MAX_WAIT_MS
+    go out as a single embedding API call (MicroBatcher), and identical
+    questions already in flight share one result instead of being sent twice.
+    A bounded LRU of normalized question -> float32 vector in front of it
+    answers repeated questions without any API call.
+    """
+
+    def __init__(self, client: AsyncEuriEmbeddingClient = None):
+        # Short timeout and few retries: a user is waiting on this call
+        self.client = client or AsyncEuriEmbeddingClient(
+            max_concurrency=settings.QUERY_EMBED_MAX_CONCURRENT_BATCHES, retries=3, timeout=10.0
+        )
+        self.batcher = MicroBatcher(
+            self.client.embed_batch,
+            max_batch_size=settings.QUERY_EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=settings.QUERY_EMBED_BATCH_MAX_WAIT_MS,
+            max_concurrent_batches=settings.QUERY_EMBED_MAX_CONCURRENT_BATCHES,
+            name="query-embedder",
+        )
+        self.cache = LRUCache(
+            max_size=settings.QUERY_EMBED_CACHE_SIZE,
+            ttl_seconds=settings.QUERY_EMBED_CACHE_TTL_SECONDS,
+            max_bytes=int(settings.QUERY_EMBED_CACHE_MAX_MB * 1024 * 1024),
+            sizeof=lambda vector: vector.nbytes,
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.deduplicated = 0
+
+    async def _embed_one(self, key: str, text: str) -> np.ndarray:
+        vector = np.asarray((await self.batcher.submit([text]))[0], dtype=np.float32)
+        self.cache.set(key, vector)
+        return vector
+
+    async def embed(self, text: str) -> List[float]:
+        """Embedding of one question; raises if the API call fails after retries"""
+        if not text or not text.strip():
+            raise ValueError("Empty text passed to QueryEmbedder.embed()")
+        # Same text up to case/whitespace -> same embedding, no API call
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector.tolist()
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._embed_one(key, text))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.deduplicated += 1
+            logging.info("Query embedding already in flight, sharing its result")
+        # Shielded so one disconnecting client does not cancel the call for the others
+        return (await asyncio.shield(future)).tolist()
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "deduplicated": self.deduplicated}
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,54 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence, Tuple
+from app.core.config import settings
+from app.core.micro_batcher import MicroBatcher
+from app.retrieval.reranker import CrossEncoderReranker
+
+
+class RerankBatcher:
+    """
+    Cross-request micro-batching for the cross-encoder.
+
+    (query, passage) pairs from concurrent hybrid_search calls are collected
+    for up to RERANK_BATCH_MAX_WAIT_MS or RERANK_BATCH_MAX_SIZE pairs, scored
+    in a single forward pass on a dedicated inference thread, and the scores
+    are scattered back to each caller.
+    """
+
+    def __init__(self, reranker: CrossEncoderReranker, max_batch_size: int = None, max_wait_ms: float = None):
+        self.reranker = reranker
+        # One inference thread: batches queue up behind it instead of fighting for the CPU
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self.batcher = MicroBatcher(
+            self._score_batch,
+            max_batch_size=max_batch_size or settings.RERANK_BATCH_MAX_SIZE,
+            max_wait_ms=settings.RERANK_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms,
+            name="rerank-batcher",
+        )
+
+    async def _score_batch(self, pairs: List[Sequence[str]]) -> List[float]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.reranker.score_pairs, pairs)
+
+    async def rerank(self, query: str, texts: List[str], ids: List[str] = None,
+                     corpus_version: str = None) -> List[Tuple[str, float]]:
+        """
+        Async counterpart of CrossEncoderReranker.rerank: returns (text, score) tuples.
+        Passing the chunk ids lets the reranker use pre-tokenized passages, and
+        cached scores are looked up and stored under `corpus_version`.
+        """
+        if not texts:
+            return []
+        if not ids:
+            scores = await self.batcher.submit([(query, text) for text in texts])
+            return list(zip(texts, scores))
+
+        # Cached scores are answered right away; only misses join a micro-batch
+        cached = self.reranker.cached_scores(query, ids, corpus_version)
+        missing = [i for i, chunk_id in enumerate(ids) if chunk_id not in cached]
+        if missing:
+            fresh = await self.batcher.submit([(query, texts[i], ids[i]) for i in missing])
+            self.reranker.store_scores(query, [ids[i] for i in missing], fresh, corpus_version)
+            cached.update(zip((ids[i] for i in missing), fresh))
+        return [(text, cached[chunk_id]) for text, chunk_id in zip(texts, ids)]
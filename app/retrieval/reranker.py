@@ -1,19 +1,110 @@
-from sentence_transformers import CrossEncoder
+from app.core.config import settings
 from app.logger import logging
-from typing import List
+from app.cache.lru import LRUCache
+from app.cache.utils import normalize_query
+from app.retrieval.token_cache import PairAssembler, PassageTokenCache
+from typing import Dict, List, Sequence
+import numpy as np
 
 class CrossEncoderReranker:
-    def __init__(self):
-        self.model=CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+    def __init__(self,batch_size:int=64,backend:str=None):
+        self.model_name=settings.RERANKER_MODEL
+        self.backend=backend or settings.RERANKER_BACKEND
+        if self.backend=="onnx":
+            # int8 onnxruntime model: no torch import, faster cold start and CPU inference
+            from app.retrieval.onnx_reranker import OnnxCrossEncoder
+            try:
+                self.model=OnnxCrossEncoder(self.model_name)
+            except FileNotFoundError as e:
+                # The export is an offline step; keep serving on the torch model meanwhile
+                logging.error(f"{e}; falling back to the torch reranker")
+                self.backend="torch"
+        if self.backend=="torch":
+            from sentence_transformers import CrossEncoder
+            self.model=CrossEncoder(self.model_name)
+        elif self.backend!="onnx":
+            raise ValueError(f"Unknown RERANKER_BACKEND '{self.backend}', expected 'torch' or 'onnx'")
+        logging.info(f"CrossEncoderReranker using {self.backend} backend for {self.model_name}")
+        self.batch_size=batch_size
+        self.tokenizer=self.model.tokenizer
+        max_length=min(getattr(self.model,"max_length",None) or self.tokenizer.model_max_length,512)
+        self.assembler=PairAssembler(self.tokenizer,max_length)
+        # Passage ids tokenized at ingestion; only the query is tokenized per request
+        self.token_cache=PassageTokenCache(self.model_name)
+        # (model version, corpus version, normalized query, chunk id) -> score. The corpus version
+        # comes with each call, so concurrent requests on either side of an index reload never
+        # share scores; entries of an old corpus just age out of the LRU.
+        self.model_version=f"{self.model_name}:{self.backend}"
+        self.score_cache=LRUCache(settings.RERANK_CACHE_SIZE,settings.RERANK_CACHE_TTL_SECONDS)
+
+    def cached_scores(self,query:str,ids:List[str],corpus_version:str=None)->Dict[str,float]:
+        """Returns {chunk_id: score} for the (query, chunk) pairs already scored on this corpus version"""
+        normalized=normalize_query(query)
+        found={}
+        for chunk_id in ids:
+            score=self.score_cache.get((self.model_version,corpus_version,normalized,chunk_id))
+            if score is not None:
+                found[chunk_id]=score
+        return found
+
+    def store_scores(self,query:str,ids:List[str],scores:List[float],corpus_version:str=None)->None:
+        normalized=normalize_query(query)
+        for chunk_id,score in zip(ids,scores):
+            self.score_cache.set((self.model_version,corpus_version,normalized,chunk_id),score)
+
+    def cache_stats(self)->dict:
+        return {**self.score_cache.stats(),"model_version":self.model_version}
+
+    def _forward(self,features:dict)->np.ndarray:
+        if self.backend=="onnx":
+            return self.model.run_features(features)
+        import torch
+        device=next(self.model.model.parameters()).device
+        with torch.no_grad():
+            logits=self.model.model(**{name:torch.as_tensor(value,device=device) for name,value in features.items()}).logits
+        # Same sigmoid CrossEncoder.predict applies for single-label models
+        return torch.sigmoid(logits[:,0]).float().cpu().numpy()
+
+    def score_pairs(self,pairs:List[Sequence[str]])->List[float]:
+        """
+        Scores (query, passage) or (query, passage, chunk_id) pairs in as few
+        forward passes as batch_size allows. Passages whose chunk_id is in the
+        token cache are not re-tokenized; queries are tokenized once each.
+        """
+        if not pairs:
+            return []
+        queries=list(dict.fromkeys(pair[0] for pair in pairs))
+        query_ids=dict(zip(queries,self.tokenizer(queries,add_special_tokens=False)["input_ids"]))
+        cached=self.token_cache.get_many([pair[2] for pair in pairs if len(pair)>2])
+        uncached=list(dict.fromkeys(pair[1] for pair in pairs if len(pair)<3 or pair[2] not in cached))
+        fresh=dict(zip(uncached,self.tokenizer(uncached,add_special_tokens=False)["input_ids"])) if uncached else {}
+        if uncached:
+            logging.info(f"Rerank token cache: {len(cached)} cached passage(s), tokenized {len(uncached)}")
+
+        sequences=[
+            (query_ids[pair[0]],cached[pair[2]] if len(pair)>2 and pair[2] in cached else fresh[pair[1]])
+            for pair in pairs
+        ]
+        scores=[]
+        for start in range(0,len(sequences),self.batch_size):
+            scores.extend(self._forward(self.assembler.assemble(sequences[start:start+self.batch_size])))
+        return [float(score) for score in scores]
     
-    def rerank(self,query:str,texts:List[str],top_k:int=5)->List[str]:
+    def rerank(self,query:str,texts:List[str],top_k:int=5,ids:List[str]=None,corpus_version:str=None)->List[str]:
         try:
             logging.info("Reranking started in rerank function of CrossEncoder class")
             if not texts:
                 return []
-            pairs=[(query,text) for text in texts]
+            if not ids:
+                return list(zip(texts, self.score_pairs([(query,text) for text in texts])))
 
-            scores = self.model.predict(pairs)
+            # Only pairs missing from the score cache reach the model
+            cached=self.cached_scores(query,ids,corpus_version)
+            missing=[i for i,chunk_id in enumerate(ids) if chunk_id not in cached]
+            fresh=self.score_pairs([(query,texts[i],ids[i]) for i in missing])
+            self.store_scores(query,[ids[i] for i in missing],fresh,corpus_version)
+            cached.update(zip((ids[i] for i in missing),fresh))
+            scores=[cached[chunk_id] for chunk_id in ids]
 
         # Return (text, score) tuples
             return list(zip(texts, scores))
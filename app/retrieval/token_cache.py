@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, List
+from app.core.config import settings
+from app.dataclasses import Chunk
+from app.logger import logging
+from app.retrieval.onnx_reranker import model_slug
+
+INDEX_VERSION = 1
+
+
+class PassageTokenCache:
+    """
+    Pre-tokenized chunk texts for one reranker tokenizer, keyed by Chunk.id.
+
+    Passage token ids (no special tokens, untruncated) are concatenated into
+    `ids.npy` (int32, mmap'd on load) and located through `index.json`
+    ({id: [start, length]}). One directory per model under TOKEN_CACHE_PATH,
+    so switching RERANKER_MODEL never reuses another vocabulary's ids.
+    """
+    IDS_FILE = "ids.npy"
+    INDEX_FILE = "index.json"
+
+    def __init__(self, model_name: str = None, cache_path: str = None):
+        self.model_name = model_name or settings.RERANKER_MODEL
+        self.cache_dir = os.path.join(cache_path or settings.TOKEN_CACHE_PATH, model_slug(self.model_name))
+        self.entries: Dict[str, list] = {}
+        self.ids = np.zeros(0, dtype=np.int32)
+        self._tokenizer = None
+        self._lock = threading.Lock()
+        try:
+            self.load()
+        except Exception as e:
+            logging.error(f"ERROR in init block of PassageTokenCache {e}")
+
+    @property
+    def _ids_path(self):
+        return os.path.join(self.cache_dir, self.IDS_FILE)
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.cache_dir, self.INDEX_FILE)
+
+    @property
+    def tokenizer(self):
+        # Only ingestion needs it; the reranker passes its own already-loaded tokenizer
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.entries
+
+    def load(self):
+        if not os.path.exists(self._index_path):
+            logging.info(f"No passage token cache found at {self.cache_dir}, starting empty")
+            return
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("format_version") != INDEX_VERSION or index.get("model") != self.model_name:
+            raise ValueError(
+                f"{self.cache_dir} holds token cache v{index.get('format_version')} for {index.get('model')}, "
+                f"expected v{INDEX_VERSION} for {self.model_name}"
+            )
+        self.ids = np.load(self._ids_path, mmap_mode="r")
+        self.entries = index["entries"]
+        logging.info(f"Loaded {len(self.entries)} pre-tokenized passages from {self.cache_dir}")
+
+    def put_many(self, chunks: List[Chunk], tokenizer=None):
+        """Tokenizes and stores chunks that are not cached yet; run at ingestion time"""
+        try:
+            with self._lock:
+                new_chunks = {chunk.id: chunk.text for chunk in chunks if chunk.id not in self.entries}
+                if not new_chunks:
+                    logging.info("PassageTokenCache put_many: nothing new to tokenize")
+                    return
+                tokenizer = tokenizer or self.tokenizer
+                encoded = tokenizer(list(new_chunks.values()), add_special_tokens=False)["input_ids"]
+
+                entries = dict(self.entries)
+                start = len(self.ids)
+                for chunk_id, token_ids in zip(new_chunks, encoded):
+                    entries[chunk_id] = [start, len(token_ids)]
+                    start += len(token_ids)
+                new_ids = [np.asarray(token_ids, dtype=np.int32) for token_ids in encoded]
+                ids = np.concatenate([np.asarray(self.ids)] + new_ids)
+
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self._ids_path + ".tmp", "wb") as f:
+                    np.save(f, ids)
+                os.replace(self._ids_path + ".tmp", self._ids_path)
+                with open(self._index_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump({"format_version": INDEX_VERSION, "model": self.model_name, "entries": entries}, f)
+                os.replace(self._index_path + ".tmp", self._index_path)
+
+                self.ids = np.load(self._ids_path, mmap_mode="r")
+                self.entries = entries
+                logging.info(f"PassageTokenCache put_many: tokenized {len(new_chunks)} chunk(s) for {self.model_name}")
+        except Exception as e:
+            logging.error(f"Error in put_many of PassageTokenCache {e}")
+
+    def get_many(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Returns {chunk_id: passage token ids} for the ids that are cached"""
+        entries, token_ids = self.entries, self.ids
+        results = {}
+        for chunk_id in ids:
+            entry = entries.get(chunk_id)
+            if entry is not None:
+                start, length = entry
+                results[chunk_id] = token_ids[start:start + length]
+        return results
+
+
+def truncate_longest_first(query_len: int, passage_len: int, budget: int):
+    """
+    Lengths kept by the fast tokenizers' "longest_first" strategy: the longer
+    side is cut down to max(budget - shorter, ceil(budget / 2)), ties cut the query.
+    """
+    if query_len + passage_len <= budget:
+        return query_len, passage_len
+    half = (budget + 1) // 2
+    if query_len > passage_len:
+        query_len = max(budget - passage_len, half)
+        return query_len, min(passage_len, budget - query_len)
+    passage_len = max(budget - query_len, half)
+    return min(query_len, budget - passage_len), passage_len
+
+
+class PairAssembler:
+    """
+    Builds cross-encoder inputs from already-tokenized (query, passage) ids,
+    matching tokenizer(query, passage, truncation="longest_first", padding=True).
+
+    The special-token template ([CLS] q [SEP] p [SEP] for BERT, <s> q </s></s> p </s>
+    for RoBERTa, ...) is read once off the tokenizer's own output for a probe pair.
+    """
+
+    def __init__(self, tokenizer, max_length: int):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.input_names = list(tokenizer.model_input_names)
+        self.pad_token_id = tokenizer.pad_token_id or 0
+
+        probe_query, probe_passage = (tokenizer(text, add_special_tokens=False)["input_ids"] for text in ("query", "passage"))
+        probe = tokenizer("query", "passage", return_token_type_ids=True)
+        ids, types = probe["input_ids"], probe["token_type_ids"]
+        q_at = self._find(ids, probe_query, 0)
+        p_at = self._find(ids, probe_passage, q_at + len(probe_query))
+        q_end, p_end = q_at + len(probe_query), p_at + len(probe_passage)
+        self.segments = [
+            (ids[:q_at], types[:q_at]),
+            (None, types[q_at]),
+            (ids[q_end:p_at], types[q_end:p_at]),
+            (None, types[p_at]),
+            (ids[p_end:], types[p_end:]),
+        ]
+        self.num_special = len(ids) - len(probe_query) - len(probe_passage)
+
+    @staticmethod
+    def _find(ids: List[int], sub: List[int], start: int) -> int:
+        for i in range(start, len(ids) - len(sub) + 1):
+            if ids[i:i + len(sub)] == sub:
+                return i
+        raise ValueError("Could not locate probe tokens in the tokenizer's pair template")
+
+    def assemble(self, sequences: List[tuple]) -> Dict[str, np.ndarray]:
+        """sequences: [(query_ids, passage_ids)] -> padded int64 input_ids/attention_mask/token_type_ids"""
+        budget = self.max_length - self.num_special
+        rows = []
+        for query_ids, passage_ids in sequences:
+            query_len, passage_len = truncate_longest_first(len(query_ids), len(passage_ids), budget)
+            parts = {0: query_ids[:query_len], 1: passage_ids[:passage_len]}
+            input_ids, type_ids, slot = [], [], 0
+            for special_ids, segment_type in self.segments:
+                if special_ids is None:
+                    input_ids.extend(int(token) for token in parts[slot])
+                    type_ids.extend([segment_type] * len(parts[slot]))
+                    slot += 1
+                else:
+                    input_ids.extend(special_ids)
+                    type_ids.extend(segment_type)
+            rows.append((input_ids, type_ids))
+
+        width = max(len(input_ids) for input_ids, _ in rows)
+        features = {
+            "input_ids": np.full((len(rows), width), self.pad_token_id, dtype=np.int64),
+            "attention_mask": np.zeros((len(rows), width), dtype=np.int64),
+            "token_type_ids": np.zeros((len(rows), width), dtype=np.int64),
+        }
+        for row, (input_ids, type_ids) in enumerate(rows):
+            features["input_ids"][row, :len(input_ids)] = input_ids
+            features["attention_mask"][row, :len(input_ids)] = 1
+            features["token_type_ids"][row, :len(type_ids)] = type_ids
+        return {name: value for name, value in features.items() if name in self.input_names}
@@ -0,0 +1,19 @@
+from app.core.config import settings
+from app.logger import logging
+
+
+def get_vector_store():
+    """
+    Returns the dense vector store selected by VECTOR_STORE_BACKEND.
+    Both backends expose upsert_chunks, query, fetch_by_ids and get_index_stats.
+    """
+    backend = settings.VECTOR_STORE_BACKEND
+    logging.info(f"Using vector store backend: {backend}")
+    if backend == "local":
+        from app.retrieval.local_vector_store import LocalVectorStore
+        return LocalVectorStore()
+    if backend != "pinecone":
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}', expected 'pinecone' or 'local'")
+    # Imported lazily so the local backend runs without the pinecone client installed
+    from app.retrieval.pinecone_manager import PineconeManager
+    return PineconeManager()
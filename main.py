@@ -1,9 +1,13 @@
+import os
 from app.core.config import settings
+from app.core.corpus_version import stamp_corpus_version
 from app.ingestion.loader import Documentloader
 from app.preprocessing.chunker import DocumentChunker
 from app.logger import logging
-from app.retrieval.pinecone_manager import PineconeManager
+from app.retrieval.vector_store import get_vector_store
 from app.retrieval.bm25 import BM25Manager
+from app.retrieval.chunk_store import ChunkStore
+from app.retrieval.token_cache import PassageTokenCache
 from app.retrieval.hybrid_retriever import HybridRetriever
 from app.generator.gpt_client import GPTClient
 from tests.evaluate_metrics import EvaluateMetrics
@@ -20,13 +24,28 @@ def main():
     chunker=DocumentChunker(chunk_size=300,chunk_overlap=120)
     unique_chunks=chunker.initiate_document_chunking(docs)
     logging.info(f"Unique chunks count from documents {len(unique_chunks)}")
-    pinecone=PineconeManager()
-    pinecone.initiate_embeddings(unique_chunks)
-    logging.info(" Stored in Pinecone")
-    logging.info(f"Pinecone Stats:{pinecone.get_index_stats()}")
+    vector_store=get_vector_store()
+    vector_store.initiate_embeddings(unique_chunks)
+    logging.info(f" Stored in {settings.VECTOR_STORE_BACKEND} vector store")
+    logging.info(f"Vector store Stats:{vector_store.get_index_stats()}")
     bm25 = BM25Manager()
-    bm25.build_index(unique_chunks)
-    bm25.save()
+    if os.path.exists(os.path.join(bm25.index_path, "manifest.json")):
+        # Incremental: only new chunks are indexed, removed ones are tombstoned
+        bm25.load()
+        bm25.sync(unique_chunks)
+        bm25.merge_segments()
+    else:
+        bm25.build_index(unique_chunks)
+        bm25.save()
+    ChunkStore().put_many(unique_chunks)
+    # Reranker passage ids, so query-time reranking only tokenizes the query
+    PassageTokenCache(settings.RERANKER_MODEL).put_many(unique_chunks)
+    if settings.RERANKER_BACKEND == "onnx":
+        # Offline step: serving workers only load the exported int8 model
+        from app.retrieval.onnx_reranker import ensure_exported
+        ensure_exported(settings.RERANKER_MODEL)
+    # Last step: serving workers switch every cache namespace to the new corpus
+    stamp_corpus_version([chunk.id for chunk in unique_chunks], bm25_generation=bm25.generation)
 
     # evaluator = EvaluateMetrics()
     # results = evaluator.evaluate_all()
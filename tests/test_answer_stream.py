@@ -0,0 +1,82 @@
+import asyncio
+from app.generator.answer_stream import AnswerStream
+
+
+class Sink:
+    """Stands in for the DB save and the semantic/global cache writes"""
+
+    def __init__(self):
+        self.saved = []
+
+    async def persist(self, answer):
+        self.saved.append(answer)
+
+
+def make_source(closed, release=None, error=None):
+    async def source():
+        try:
+            yield "Metformin "
+            yield "is "
+            if release is not None:
+                await release.wait()
+            if error is not None:
+                raise error
+            yield "first-line."
+        finally:
+            closed.append(True)
+    return source()
+
+
+def test_cancelled_stream_is_never_persisted_or_cached():
+    async def scenario():
+        closed, received, sink = [], [], Sink()
+        answer = AnswerStream(make_source(closed, release=asyncio.Event()))
+
+        async def client():
+            async for token in answer.stream():
+                received.append(token)
+
+        # The client disconnects halfway: Starlette cancels the response task
+        task = asyncio.create_task(client())
+        while len(received) < 2:
+            await asyncio.sleep(0)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # ...and still runs the background task afterwards
+        finalized = await answer.finalize(sink.persist)
+        return answer, received, finalized, sink.saved, closed
+
+    answer, received, finalized, saved, closed = asyncio.run(scenario())
+    assert received == ["Metformin ", "is "]
+    assert not answer.completed and answer.parts == []
+    assert not finalized and saved == []
+    # The token source (e.g. a shared flight) is released right away
+    assert closed == [True]
+
+
+def test_failed_stream_apologises_and_is_not_persisted():
+    async def scenario():
+        sink = Sink()
+        answer = AnswerStream(make_source([], error=RuntimeError("provider failed")))
+        received = [token async for token in answer.stream()]
+        return received, await answer.finalize(sink.persist), sink.saved
+
+    received, finalized, saved = asyncio.run(scenario())
+    assert received[-1] == AnswerStream.INTERRUPTED
+    assert not finalized and saved == []
+
+
+def test_completed_stream_is_persisted():
+    async def scenario():
+        sink = Sink()
+        answer = AnswerStream(make_source([]))
+        received = [token async for token in answer.stream()]
+        return received, await answer.finalize(sink.persist), sink.saved
+
+    received, finalized, saved = asyncio.run(scenario())
+    assert "".join(received) == "Metformin is first-line."
+    assert finalized and saved == ["Metformin is first-line."]
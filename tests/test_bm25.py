@@ -0,0 +1,168 @@
+import os
+import struct
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+from app.dataclasses import Chunk
+from app.retrieval.bm25 import MANIFEST_FILE, BM25Manager
+from app.retrieval.bm25_engine import SparseBM25
+from app.retrieval.bm25_format import open_index, write_index
+
+VOCAB = [f"term{i}" for i in range(60)]
+QUERIES = ["term1 term7", "term3 term3 term50", "term0 term12 term33 term59", "term5 unknownterm"]
+
+
+def make_chunks(n, seed=0, start=0):
+    # Zipf-like term frequencies, so some terms are common (negative idf) and some rare
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(VOCAB) + 1)
+    weights /= weights.sum()
+    return [
+        Chunk(text=f"doc{start + i} " + " ".join(rng.choice(VOCAB, size=rng.integers(5, 30), p=weights)), metadata={})
+        for i in range(n)
+    ]
+
+
+def okapi_top_k(chunks, query, k):
+    """(chunk id, score) of the reference BM25Okapi top-k"""
+    scores = BM25Okapi([chunk.text.split() for chunk in chunks]).get_scores(query.split())
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [(chunks[i].id, scores[i]) for i in order if scores[i] > 0]
+
+
+def assert_matches_okapi(manager, chunks, query, k=10):
+    results = manager.search(query, top_k=k)
+    expected = okapi_top_k(chunks, query, k)
+    assert results
+    np.testing.assert_allclose([score for _, score in results], [score for _, score in expected], rtol=1e-5, atol=1e-5)
+    # Same scores per chunk (ties may come back in either order)
+    reference = dict(zip(
+        (chunk.id for chunk in chunks),
+        BM25Okapi([chunk.text.split() for chunk in chunks]).get_scores(query.split()),
+    ))
+    for chunk_id, score in results:
+        assert score == pytest.approx(reference[chunk_id], rel=1e-5, abs=1e-5)
+
+
+def build_manager(tmp_path, chunks, max_segments=10):
+    manager = BM25Manager(index_path=str(tmp_path), max_segments=max_segments)
+    manager.build_index(chunks)
+    manager.save()
+    return manager
+
+
+def test_engine_scores_match_rank_bm25():
+    corpus = [chunk.text.split() for chunk in make_chunks(50)]
+    engine = SparseBM25().build(corpus)
+    reference = BM25Okapi(corpus)
+    for query in QUERIES:
+        np.testing.assert_allclose(engine.get_scores(query.split()), reference.get_scores(query.split()), rtol=1e-5, atol=1e-5)
+
+
+def test_search_top_k_matches_rank_bm25(tmp_path):
+    chunks = make_chunks(50)
+    manager = build_manager(tmp_path, chunks)
+    for query in QUERIES:
+        assert_matches_okapi(manager, chunks, query)
+
+
+def test_save_load_round_trip_through_mmap(tmp_path):
+    chunks = make_chunks(40)
+    manager = build_manager(tmp_path, chunks)
+
+    loaded = BM25Manager(index_path=str(tmp_path))
+    loaded.load()
+    assert loaded.generation == manager.generation
+    engine = loaded.segments[0].engine
+    assert engine.mmap is not None
+    assert list(loaded.segments[0].chunk_ids) == [chunk.id for chunk in chunks]
+    for query in QUERIES:
+        assert loaded.search(query, top_k=10) == manager.search(query, top_k=10)
+
+
+def test_index_file_round_trip(tmp_path):
+    corpus = [chunk.text.split() for chunk in make_chunks(20)]
+    engine = SparseBM25().build(corpus)
+    path = str(tmp_path / "seg.bin")
+    write_index(path, engine, [f"id{i}" for i in range(len(corpus))])
+
+    opened, chunk_ids = open_index(path)
+    assert list(chunk_ids) == [f"id{i}" for i in range(len(corpus))]
+    assert sorted(opened.vocab) == sorted(engine.vocab)
+    assert all(opened.vocab[term] == engine.vocab[term] for term in engine.vocab)
+    assert "missing" not in opened.vocab
+    for name in ("indptr", "doc_ids", "tfs", "doc_len", "idf"):
+        np.testing.assert_array_equal(getattr(opened, name), getattr(engine, name))
+    assert opened.avgdl == pytest.approx(engine.avgdl)
+
+
+def test_mismatched_format_version_is_rejected(tmp_path):
+    engine = SparseBM25().build([chunk.text.split() for chunk in make_chunks(5)])
+    path = str(tmp_path / "seg.bin")
+    write_index(path, engine, [f"id{i}" for i in range(5)])
+    with open(path, "r+b") as f:
+        # The format version follows the 8-byte magic
+        f.seek(8)
+        f.write(struct.pack("<I", 999))
+    with pytest.raises(ValueError, match="format version"):
+        open_index(path)
+
+
+def test_mismatched_manifest_version_is_rejected(tmp_path):
+    build_manager(tmp_path, make_chunks(5))
+    manifest = tmp_path / MANIFEST_FILE
+    manifest.write_text(manifest.read_text().replace('"format_version": 1', '"format_version": 999'))
+    with pytest.raises(ValueError, match="manifest version"):
+        BM25Manager(index_path=str(tmp_path)).load()
+
+
+def test_scores_identical_before_and_after_merge(tmp_path):
+    first, second, third = make_chunks(30, seed=1), make_chunks(10, seed=2, start=30), make_chunks(5, seed=3, start=40)
+    manager = build_manager(tmp_path, first)
+    manager.add_chunks(second)
+    manager.add_chunks(third)
+    assert len(manager.segments) == 3
+
+    chunks = first + second + third
+    before = {query: manager.search(query, top_k=10) for query in QUERIES}
+    for query in QUERIES:
+        # Cross-segment stats make a segmented index score like one index over everything
+        assert_matches_okapi(manager, chunks, query)
+
+    manager.merge_segments(force=True)
+    assert len(manager.segments) == 1
+    for query in QUERIES:
+        after = manager.search(query, top_k=10)
+        np.testing.assert_allclose([s for _, s in after], [s for _, s in before[query]], rtol=1e-5, atol=1e-5)
+        assert_matches_okapi(manager, chunks, query)
+
+
+def test_deleted_chunks_never_returned_before_or_after_merge(tmp_path):
+    chunks = make_chunks(40, seed=4)
+    manager = build_manager(tmp_path, chunks[:30])
+    manager.add_chunks(chunks[30:])
+    # Few enough tombstones that no background merge kicks in
+    deleted = {chunks[2].id, chunks[17].id, chunks[33].id}
+    # A deleted chunk's own text would otherwise rank it first
+    queries = QUERIES + [chunk.text for chunk in chunks if chunk.id in deleted]
+    assert {manager.search(query, top_k=1)[0][0] for query in queries[len(QUERIES):]} == deleted
+    manager.delete_chunks(list(deleted))
+
+    for query in queries:
+        assert not deleted & {chunk_id for chunk_id, _ in manager.search(query, top_k=40)}
+
+    manager.merge_segments(force=True)
+    segment = manager.segments[0]
+    assert not segment.deleted and not deleted & set(segment.chunk_ids)
+    live = [chunk for chunk in chunks if chunk.id not in deleted]
+    for query in queries:
+        assert not deleted & {chunk_id for chunk_id, _ in manager.search(query, top_k=40)}
+    for query in QUERIES:
+        # Once merged away, tombstoned docs no longer count in the corpus stats
+        assert_matches_okapi(manager, live, query)
+
+    reloaded = BM25Manager(index_path=str(tmp_path))
+    reloaded.load()
+    assert not deleted & set(reloaded.segments[0].chunk_ids)
+    # The segments holding the tombstoned docs are gone from disk
+    assert {name for name in os.listdir(tmp_path) if name.endswith(".bin")} == {segment.name}
@@ -0,0 +1,58 @@
+from app.core.tokenizer import count_tokens, split_sentences
+from app.generator.context_packer import ContextPacker
+
+
+def test_split_sentences_keeps_abbreviations_within_a_line():
+    assert split_sentences("Seen by Dr. Smith today. Discharged on day 3.") == [
+        "Seen by Dr. Smith today.",
+        "Discharged on day 3.",
+    ]
+
+
+def test_split_sentences_never_merges_across_line_breaks():
+    assert split_sentences("Next line etc.\nAnother line") == ["Next line etc.", "Another line"]
+    assert split_sentences("Dose in mg.\n\n- Give with food\n- Avoid alcohol") == [
+        "Dose in mg.",
+        "- Give with food",
+        "- Avoid alcohol",
+    ]
+
+
+def test_pack_respects_budget_and_keeps_leading_sentences():
+    sentence = "Metformin is first-line therapy for type 2 diabetes."
+    short = "Insulin is added when targets are not met."
+    long = " ".join([sentence] * 40)
+    packer = ContextPacker(token_budget=400, answer_tokens=100, history_tokens=60)
+    template_tokens = 50
+    history = [{"role": "system", "content": "Summary: patient asked about diabetes."}] + [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} about glucose control"}
+        for i in range(20)
+    ]
+
+    packed = packer.pack(template_tokens, [short, long], history)
+    stats = packed.stats
+
+    # The answer reservation is never handed to the prompt
+    assert stats["budget"] == 300
+    assert stats["prompt_tokens"] == template_tokens + stats["history_tokens"] + stats["context_tokens"]
+    assert stats["prompt_tokens"] <= stats["budget"]
+
+    # Summary first, then the most recent messages within the history cap
+    assert stats["history_tokens"] <= 60
+    assert packed.history[0]["role"] == "system"
+    assert packed.history[-1] == history[-1]
+    assert len(packed.history) == stats["history_messages"] < len(history)
+
+    # The first chunk fits whole; the second is cut at a sentence boundary
+    assert packed.contexts[0] == short
+    assert stats["contexts_whole"] == 1 and stats["contexts_partial"] == 1
+    partial = packed.contexts[1]
+    assert long.startswith(partial) and partial.endswith(".") and partial != long
+    assert stats["context_tokens"] == sum(count_tokens(c) for c in packed.contexts) + packer.separator_tokens
+
+
+def test_pack_drops_history_and_contexts_when_template_fills_budget():
+    packer = ContextPacker(token_budget=200, answer_tokens=100, history_tokens=60)
+    packed = packer.pack(150, ["Some retrieved context."], [{"role": "user", "content": "hello there"}])
+    assert packed.contexts == [] and packed.history == []
+    assert packed.stats["context_tokens"] == 0 and packed.stats["history_tokens"] == 0
@@ -0,0 +1,43 @@
+import numpy as np
+from app.core.config import settings
+from app.dataclasses import Chunk
+from app.retrieval.local_vector_store import LocalVectorStore
+
+
+def make_chunks(n):
+    return [Chunk(text=f"chunk number {i} about clinical guidelines", metadata={"source": f"doc{i}"}) for i in range(n)]
+
+
+def test_default_construction_upsert_and_query(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_VECTOR_STORE_PATH", str(tmp_path))
+    store = LocalVectorStore()
+    assert store.dimension == settings.EMBEDDING_DIMENSION
+    assert store.vectors.shape == (0, settings.EMBEDDING_DIMENSION)
+    assert store.query(vector=[0.0] * store.dimension, top_k=3).matches == []
+
+    rng = np.random.default_rng(0)
+    chunks = make_chunks(5)
+    embeddings = rng.normal(size=(5, store.dimension)).tolist()
+    store.upsert_chunks(chunks, embeddings)
+
+    result = store.query(vector=embeddings[2], top_k=3)
+    assert [match.id for match in result.matches][0] == chunks[2].id
+    assert result.matches[0].score > 0.99
+    assert result.matches[0].metadata["text"] == chunks[2].text
+    assert store.get_index_stats()["total_vector_count"] == 5
+
+    # A fresh default store reloads what was written
+    reloaded = LocalVectorStore()
+    assert reloaded.ids == store.ids
+    assert reloaded.query(vector=embeddings[4], top_k=1).matches[0].id == chunks[4].id
+
+
+def test_upsert_replaces_existing_ids(tmp_path):
+    store = LocalVectorStore(index_path=str(tmp_path), dimension=4)
+    chunks = make_chunks(2)
+    store.upsert_chunks(chunks, [[1, 0, 0, 0], [0, 1, 0, 0]])
+    store.upsert_chunks(chunks[:1], [[0, 0, 1, 0]])
+
+    assert len(store.ids) == 2
+    assert store.query(vector=[0, 0, 1, 0], top_k=1).matches[0].id == chunks[0].id
+    assert store.fetch_by_ids([chunks[1].id])["vectors"][chunks[1].id]["metadata"]["source"] == "doc1"
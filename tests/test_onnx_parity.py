@@ -0,0 +1,32 @@
+import numpy as np
+from app.retrieval.onnx_reranker import PARITY_PAIRS, parity_report
+
+
+TORCH_SCORES = np.array([0.91, 0.02, 0.80, 0.30, 0.95, 0.05])
+
+
+def report(onnx_scores, **overrides):
+    options = {"max_abs_diff": 0.05, "top_k": 1, "min_agreement": 1.0, **overrides}
+    return parity_report(PARITY_PAIRS, TORCH_SCORES, np.asarray(onnx_scores), **options)
+
+
+def test_parity_passes_within_tolerance():
+    result = report(TORCH_SCORES + 0.01)
+    assert result["passed"]
+    assert result["ranking_agreement"] == 1.0
+    assert abs(result["max_abs_diff"] - 0.01) < 1e-9
+
+
+def test_parity_fails_on_large_score_difference():
+    onnx_scores = TORCH_SCORES.copy()
+    onnx_scores[1] = 0.2
+    result = report(onnx_scores)
+    assert not result["passed"]
+    assert result["ranking_agreement"] == 1.0
+
+
+def test_parity_fails_when_top_k_ranking_flips():
+    # Small score differences, but the second query's best passage changes
+    onnx_scores = np.array([0.91, 0.02, 0.54, 0.56, 0.95, 0.05])
+    assert not report(onnx_scores, max_abs_diff=1.0)["passed"]
+    assert report(onnx_scores, max_abs_diff=1.0, min_agreement=0.6)["passed"]
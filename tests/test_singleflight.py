@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from app.core.singleflight import SingleFlight
+
+
+async def collect(stream):
+    tokens = []
+    try:
+        async for token in stream:
+            tokens.append(token)
+    except Exception as e:
+        return tokens, e
+    return tokens, None
+
+
+def test_late_joiner_replays_buffered_tokens():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            yield "a"
+            yield "b"
+            await release.wait()
+            yield "c"
+
+        first, leader = flights.join("k", produce)
+        first_stream = first.stream()
+        head = [await first_stream.__anext__(), await first_stream.__anext__()]
+
+        second, second_leader = flights.join("k", produce)
+        release.set()
+        late, rest = await asyncio.gather(collect(second.stream()), collect(first_stream))
+        return leader, second_leader, second is first, head, late, rest, calls, flights.stats()
+
+    leader, second_leader, same, head, late, rest, calls, stats = asyncio.run(scenario())
+    assert leader and not second_leader and same
+    assert head == ["a", "b"]
+    assert late == (["a", "b", "c"], None)
+    assert rest == (["c"], None)
+    assert len(calls) == 1
+    assert stats == {"in_flight": 0, "started": 1, "coalesced": 1}
+
+
+def test_error_reaches_every_subscriber():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def produce():
+            yield "a"
+            await asyncio.sleep(0)
+            raise ValueError("provider failed")
+
+        first, _ = flights.join("k", produce)
+        second, _ = flights.join("k", produce)
+        results = await asyncio.gather(collect(first.stream()), collect(second.stream()))
+        _, leader = flights.join("k", produce)
+        return results, leader
+
+    results, leader_after_error = asyncio.run(scenario())
+    for tokens, error in results:
+        assert tokens == ["a"]
+        assert isinstance(error, ValueError)
+    # A failed flight is forgotten, so the next caller starts a new one
+    assert leader_after_error
+
+
+def test_task_cancelled_when_last_subscriber_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        stopped = []
+
+        async def produce():
+            try:
+                yield "a"
+                await asyncio.Event().wait()
+            finally:
+                stopped.append(True)
+
+        flight, _ = flights.join("k", produce)
+        flights.join("k", produce)
+        first, second = flight.stream(), flight.stream()
+        assert await first.__anext__() == "a"
+        assert await second.__anext__() == "a"
+
+        await first.aclose()
+        await asyncio.sleep(0)
+        still_running = not flight.task.done()
+
+        await second.aclose()
+        # A cancelled flight is never joined again, even before its task has unwound
+        replacement, leader = flights.join("k", produce)
+        with pytest.raises(asyncio.CancelledError):
+            await flight.task
+        stopped_before_replacement = list(stopped)
+        replacement.cancel()
+        return still_running, flight, leader, replacement is flight, stopped_before_replacement
+
+    still_running, flight, leader, reused, stopped = asyncio.run(scenario())
+    assert still_running
+    assert flight.cancelled and flight.task.cancelled()
+    assert leader and not reused
+    assert stopped == [True]